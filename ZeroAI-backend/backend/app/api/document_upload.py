@@ -9,6 +9,7 @@ import os
 import uuid
 import logging
 import json
+import string
 from datetime import datetime
 
 from app.core.mysql_client import get_db
@@ -19,6 +20,9 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/document-upload", tags=["文档上传"])
 
+# 英文字母集合（Community翻译检测用）
+ASCII_LETTERS = frozenset(string.ascii_letters)
+
 
 class DocumentUploadResponse(BaseModel):
     """文档上传响应"""
@@ -252,9 +256,18 @@ async def delete_document(
                 except Exception as e:
                     logger.warning(f"删除structured_content.json文件失败: {e}")
         
-        # 删除解析文件目录（如果为空）
+        # 删除文档解析缓存（处理任务生成的doc_data.json）
         document_id_for_content = f"upload_{document_id}"
         parsed_content_dir = os.path.join("/app", "uploads", "parsed_content", document_id_for_content)
+        doc_data_cache_file_abs = os.path.join(parsed_content_dir, "doc_data.json")
+        if os.path.exists(doc_data_cache_file_abs):
+            try:
+                os.remove(doc_data_cache_file_abs)
+                logger.info(f"已删除文档解析缓存: {doc_data_cache_file_abs}")
+            except Exception as e:
+                logger.warning(f"删除文档解析缓存失败: {e}")
+        
+        # 删除解析文件目录（如果为空）
         if os.path.exists(parsed_content_dir):
             try:
                 # 检查目录是否为空
@@ -550,9 +563,11 @@ async def parse_document(
             
             # 按章节输出每个章节的内容
             section_list = []
+            section_index = WordDocumentService._build_section_index(doc_data["structured_content"])
             for idx, section in enumerate(sections):
                 section_content = WordDocumentService._build_section_content(
-                    section, doc_data, idx, document_id_for_content, upload_id
+                    section, doc_data, idx, document_id_for_content, upload_id,
+                    section_index=section_index
                 )
                 if section_content:  # 只添加非空内容
                     parsed_content += section_content + "\n\n"
@@ -1226,9 +1241,11 @@ async def process_document(
                         logger.info(f"文档分为 {len(sections)} 个章节（重新分块）")
                         
                         # 按章节输出每个章节的内容
+                        section_index = WordDocumentService._build_section_index(doc_data["structured_content"])
                         for idx, section in enumerate(sections):
                             section_content = WordDocumentService._build_section_content(
-                                section, doc_data, idx, document_id_for_content, upload_id
+                                section, doc_data, idx, document_id_for_content, upload_id,
+                                section_index=section_index
                             )
                             if section_content:
                                 parsed_content += section_content + "\n\n"
@@ -1992,16 +2009,17 @@ async def build_communities(
         logger.info(f"检查并翻译英文summary为中文")
         try:
             import re
-            # 简单的英文检测：如果summary中超过50%是英文字符，认为是英文
-            def is_mostly_english(text):
+            # 简单的英文检测：英文字符占比超过50%且不含中文时需要翻译。
+            # 不含中文时英文占比必为100%，因此等价于"含英文字母且不含中文"：
+            # set(text) 一次遍历得到去重字符集，再在（通常很小的）字符集上同时判断两者
+            def needs_translation(text):
                 if not text:
                     return False
-                # 统计英文字母数量
-                english_chars = len(re.findall(r'[a-zA-Z]', text))
-                total_chars = len(re.findall(r'[a-zA-Z\u4e00-\u9fff]', text))  # 英文+中文
-                if total_chars == 0:
+                chars = set(text)
+                if chars.isdisjoint(ASCII_LETTERS):
                     return False
-                return english_chars / total_chars > 0.5
+                # 纯ASCII文本（最常见的英文情况）不可能包含中文，跳过逐字符检测
+                return text.isascii() or not any('\u4e00' <= c <= '\u9fff' for c in chars)
             
             # 翻译英文summary
             for community_data in communities_data:
@@ -2010,8 +2028,8 @@ async def build_communities(
                 community_uuid = community_data.get("uuid")
                 
                 # 检查name和summary是否为英文
-                need_translate_name = is_mostly_english(comm_name) and not any('\u4e00' <= c <= '\u9fff' for c in comm_name)
-                need_translate_summary = is_mostly_english(comm_summary) and not any('\u4e00' <= c <= '\u9fff' for c in comm_summary)
+                need_translate_name = needs_translation(comm_name)
+                need_translate_summary = needs_translation(comm_summary)
                 
                 if need_translate_name or need_translate_summary:
                     try:
@@ -2165,23 +2183,22 @@ async def build_communities(
         communities = []
         total_entities = 0
         
-        for community_data in communities_data:
+        # 查询每个Community包含的实体数量（在同一个事务中执行，避免每个Community单独开启会话）
+        # Graphiti实际使用的关系类型是 HAS_MEMBER (Community -> Entity)
+        # 同时支持其他可能的关系类型：CONTAINS, BELONGS_TO
+        entity_count_query = """
+        MATCH (c:Community {uuid: $community_uuid})
+        OPTIONAL MATCH (c)-[:HAS_MEMBER|CONTAINS]->(e1:Entity)
+        OPTIONAL MATCH (e2:Entity)-[:BELONGS_TO]->(c)
+        RETURN count(DISTINCT e1) + count(DISTINCT e2) as entity_count
+        """
+        communities_with_uuid = [c for c in communities_data if c.get("uuid")]
+        entity_results = neo4j_client.execute_many(entity_count_query, [
+            {"community_uuid": c["uuid"]} for c in communities_with_uuid
+        ]) if communities_with_uuid else []
+        
+        for community_data, entity_result in zip(communities_with_uuid, entity_results):
             community_uuid = community_data.get("uuid")
-            if not community_uuid:
-                continue
-                
-            # 查询该Community包含的实体数量
-            # Graphiti实际使用的关系类型是 HAS_MEMBER (Community -> Entity)
-            # 同时支持其他可能的关系类型：CONTAINS, BELONGS_TO
-            entity_count_query = """
-            MATCH (c:Community {uuid: $community_uuid})
-            OPTIONAL MATCH (c)-[:HAS_MEMBER|CONTAINS]->(e1:Entity)
-            OPTIONAL MATCH (e2:Entity)-[:BELONGS_TO]->(c)
-            RETURN count(DISTINCT e1) + count(DISTINCT e2) as entity_count
-            """
-            entity_result = neo4j_client.execute_query(entity_count_query, {
-                "community_uuid": community_uuid
-            })
             entity_count = entity_result[0].get("entity_count", 0) if entity_result else 0
             logger.info(f"Community {community_uuid} 包含 {entity_count} 个实体")
             total_entities += entity_count
@@ -750,9 +750,11 @@ async def get_realtime_parsed_content(
         
         # 构建解析后的内容
         parsed_content = ""
+        section_index = WordDocumentService._build_section_index(doc_data["structured_content"])
         for idx, section in enumerate(sections):
             section_content = WordDocumentService._build_section_content(
-                section, doc_data, idx, document_id
+                section, doc_data, idx, document_id,
+                section_index=section_index
             )
             parsed_content += section_content + "\n\n"
         
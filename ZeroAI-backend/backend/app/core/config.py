@@ -35,6 +35,8 @@ class Settings(BaseSettings):
     LOCAL_LLM_API_BASE_URL: str = ""
     LOCAL_LLM_API_KEY: str = ""
     LOCAL_LLM_MODEL: str = ""
+    # 本地大模型最大并发请求数（Community翻译等批量调用）
+    LOCAL_LLM_CONCURRENCY: int = 8
     
     # Ollama Embedding配置（从.env读取）
     OLLAMA_BASE_URL: str
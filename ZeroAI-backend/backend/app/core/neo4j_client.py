@@ -1,5 +1,7 @@
 from neo4j import GraphDatabase
 from app.core.config import settings
+import asyncio
+import functools
 import logging
 import time
 
@@ -55,6 +57,49 @@ class Neo4jClient:
                     logger.error(f"Neo4j查询最终失败: {e}")
                     raise
     
+    def execute_many(self, query: str, parameters_list: list, retry_count: int = 3):
+        """
+        在同一个会话和读事务中对多组参数执行同一条Cypher查询，带重试机制
+        
+        Returns:
+            与 parameters_list 一一对应的记录列表
+        """
+        def run_all(tx):
+            return [
+                [record.data() for record in tx.run(query, parameters)]
+                for parameters in parameters_list
+            ]
+        
+        for attempt in range(retry_count):
+            try:
+                # 如果连接不健康，尝试重新连接
+                if attempt > 0:
+                    if not self._verify_connectivity():
+                        logger.warning(f"Neo4j连接不健康，等待后重试... (尝试 {attempt + 1}/{retry_count})")
+                        time.sleep(1)  # 等待1秒后重试
+                
+                with self.get_session() as session:
+                    return session.execute_read(run_all)
+            except Exception as e:
+                logger.warning(f"Neo4j批量查询失败 (尝试 {attempt + 1}/{retry_count}): {e}")
+                if attempt < retry_count - 1:
+                    time.sleep(1)  # 等待后重试
+                else:
+                    logger.error(f"Neo4j批量查询最终失败: {e}")
+                    raise
+    
+    def execute_query_stream(self, query: str, parameters: dict = None):
+        """
+        执行Cypher查询并逐条返回记录（不一次性缓存全部结果）
+        
+        记录在迭代过程中从服务端拉取，会话在迭代结束后关闭；
+        由于部分结果可能已被消费，此方法不做重试
+        """
+        with self.get_session() as session:
+            result = session.run(query, parameters or {})
+            for record in result:
+                yield record.data()
+    
     def execute_write(self, query: str, parameters: dict = None, retry_count: int = 3):
         """执行写操作，带重试机制"""
         last_error = None
@@ -77,6 +122,14 @@ class Neo4jClient:
                 else:
                     logger.error(f"Neo4j写操作最终失败: {e}")
                     raise
+    
+    async def execute_write_async(self, query: str, parameters: dict = None, retry_count: int = 3):
+        """在线程池中执行写操作，避免同步驱动调用阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None,
+            functools.partial(self.execute_write, query, parameters, retry_count)
+        )
 
 
 # 全局Neo4j客户端实例
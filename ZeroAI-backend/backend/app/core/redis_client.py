@@ -3,6 +3,9 @@ Redis客户端（用于缓存）
 """
 import redis
 from app.core.config import settings
+from typing import Optional
+import hashlib
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -43,3 +46,35 @@ def clear_redis_client():
     global _redis_client
     _redis_client = None
 
+
+# 翻译结果缓存时间（14天）
+TRANSLATION_CACHE_TTL = 14 * 86400
+
+
+def _translation_cache_key(name: str, summary: str, model: str) -> str:
+    """生成翻译缓存key（按原文和模型区分）"""
+    digest = hashlib.sha256(f"{name}\x00{summary}\x00{model}".encode()).hexdigest()
+    return f"translate:v1:{digest}"
+
+
+def get_cached_translation(name: str, summary: str, model: str) -> Optional[dict]:
+    """读取缓存的翻译结果，未命中或Redis不可用时返回None"""
+    try:
+        cached = get_redis_client().get(_translation_cache_key(name, summary, model))
+        if cached:
+            return json.loads(cached)
+    except Exception as e:
+        logger.warning(f"Redis翻译缓存读取失败: {e}")
+    return None
+
+
+def cache_translation(name: str, summary: str, model: str, translated: dict):
+    """缓存翻译结果"""
+    try:
+        get_redis_client().setex(
+            _translation_cache_key(name, summary, model),
+            TRANSLATION_CACHE_TTL,
+            json.dumps(translated, ensure_ascii=False)
+        )
+    except Exception as e:
+        logger.warning(f"Redis翻译缓存写入失败: {e}")
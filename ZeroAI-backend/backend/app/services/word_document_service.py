@@ -4,9 +4,18 @@ Word 文档处理服务
 实现 Word 文档的解析、分块和 Episode 创建
 """
 from docx import Document
+from docx.oxml.ns import qn
+from lxml import etree
+from lxml.etree import XPath
 from typing import Dict, List, Any, Optional
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import numpy as np
+import asyncio
+import io
 import os
+import re
 import logging
 import uuid
 from app.core.graphiti_client import get_graphiti_instance
@@ -14,10 +23,179 @@ from app.models.graphiti_entities import ENTITY_TYPES, EDGE_TYPES, EDGE_TYPE_MAP
 
 logger = logging.getLogger(__name__)
 
+# 预编译的图片查找XPath及关系属性名（避免每个run重复编译、解析命名空间）
+_BLIP_XPATH = XPath('.//a:blip', namespaces={'a': 'http://schemas.openxmlformats.org/drawingml/2006/main'})
+_EMBED_QN = qn('r:embed')
+_LINK_QN = qn('r:link')
+
+# 无标准签名时的Office文本特征（单次扫描文件头），按优先级排列：Excel > Word > PowerPoint
+_OLE_TEXT_SIG_RE = re.compile(b'Microsoft Excel|Workbook|Microsoft Word|WordDocument|PowerPoint')
+_OLE_TEXT_SIG_EXT = (
+    ((b'Microsoft Excel', b'Workbook'), '.xls'),
+    ((b'Microsoft Word', b'WordDocument'), '.doc'),
+    ((b'PowerPoint',), '.ppt'),
+)
+
+# 容器格式签名：ZIP（.docx/.xlsx/.pptx）与 OLE2（Composite Document File V2: D0 CF 11 E0 A1 B1 1A E1）
+_ZIP_SIGNATURE = b'PK'
+_OLE2_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+
+def _detect_container(data: bytes) -> str:
+    """根据文件头签名判断容器类型，返回 'zip' | 'ole2' | 'other'"""
+    if data.startswith(_ZIP_SIGNATURE):
+        return 'zip'
+    if data.startswith(_OLE2_SIGNATURE):
+        return 'ole2'
+    return 'other'
+
+
+# 扩展名 -> 图片格式名缓存（如 .png -> PNG）
+_FORMAT_CACHE: Dict[str, str] = {}
+
+
+def _format_for_ext(ext: str) -> str:
+    """将扩展名转换为格式名（去掉点号，转为大写），结果按扩展名缓存"""
+    file_format = _FORMAT_CACHE.get(ext)
+    if file_format is None:
+        file_format = ext[1:].upper() if ext else 'UNKNOWN'
+        _FORMAT_CACHE[ext] = file_format
+    return file_format
+
+
+@lru_cache(maxsize=4096)
+def _estimate_tokens_cached(text: str) -> int:
+    """
+    按文本缓存的 token 估算
+    
+    按 (UTF-8 字节数 + 字符数) / 4 估算：英文约 2 字符 ≈ 1 token，中文约 1 字符 ≈ 1 token；
+    纯 ASCII 文本两者相等，直接按长度计算，无需编码
+    """
+    if text.isascii():
+        return len(text) >> 1
+    return (len(text.encode('utf-8')) + len(text)) >> 2
+
+
+# 文档名称中的版本号后缀（支持多种格式）
+_VERSION_SUFFIX_PATTERNS = [re.compile(p, re.IGNORECASE) for p in (
+    r'\s*-\s*V\d+$',           # " - V1"
+    r'\s*-\s*v\d+$',           # " - v1"
+    r'\s*版本\d+$',             # " 版本1"
+    r'\s*Version\s*\d+$',      # " Version 1"
+    r'\s*version\s*\d+$',      # " version 1"
+)]
+_VERSION_RE = re.compile(r'V(\d+)', re.IGNORECASE)
+# group_id 只允许字母数字、破折号和下划线
+_SANITIZE_RE = re.compile(r'[^a-zA-Z0-9\-_]')
+_UNDERSCORE_RE = re.compile(r'_+')
+# 概述相关章节标题的关键词
+_OVERVIEW_RE = re.compile("|".join(map(re.escape, ["概述", "功能说明", "功能描述", "系统说明", "项目说明", "简介", "背景"])))
+# "文档修改记录"表格标题的关键词（文档修改记录、修改记录、修订记录等）
+_MODIFICATION_RE = re.compile("文档修改记录|修改记录|修订记录|版本记录")
+
+
+# 文档名称相关的解析结果按名称缓存：同一批导入中相同的名称会被反复处理
+@lru_cache(maxsize=1024)
+def _extract_base_name_cached(document_name: str) -> str:
+    base_name = document_name
+    for pattern in _VERSION_SUFFIX_PATTERNS:
+        base_name = pattern.sub('', base_name)
+    return base_name.strip()
+
+
+@lru_cache(maxsize=1024)
+def _extract_version_cached(document_name: str) -> tuple:
+    version_match = _VERSION_RE.search(document_name)
+    if version_match:
+        version_num = int(version_match.group(1))
+        return f"V{version_num}", version_num
+    # 如果找不到，返回默认值
+    return "V1", 1
+
+
+@lru_cache(maxsize=1024)
+def _sanitize_group_id_cached(name: str) -> str:
+    # 将中文字符和其他特殊字符替换为下划线，只保留字母数字、破折号、下划线
+    sanitized = _SANITIZE_RE.sub('_', name)
+    # 将连续的下划线替换为单个下划线，并去除开头和结尾的下划线
+    sanitized = _UNDERSCORE_RE.sub('_', sanitized).strip('_')
+    # 如果清理后为空，使用默认值；限制长度（避免过长）
+    return (sanitized or "document")[:50]
+
+
+# structured_content 条目类型（解析器与分块共用的常量）
+# 分块时用 == 比较：从 JSON 加载的 structured_content 中的类型字符串与常量不是同一对象
+_T_HEADING = "heading"
+_T_PARAGRAPH = "paragraph"
+_T_TABLE = "table"
+_T_IMAGE = "image_only"
+_T_OLE = "ole_only"
+
+# Episode 来源描述
+_SRC_DOC = "Word文档"
+_SRC_SECTION = "Word文档章节"
+_SRC_IMAGE = "Word文档图片"
+_SRC_TABLE = "Word文档表格"
+
+# Markdown表格单元格中管道符的转义表
+_PIPE_TRANS = str.maketrans({'|': '\\|'})
+
+# ProgId关键词 -> (旧版扩展名, OOXML扩展名)，按匹配优先级排列
+_PROGID_EXT = (
+    ('excel', '.xls', '.xlsx'),
+    ('word', '.doc', '.docx'),
+    ('powerpoint', '.ppt', '.pptx'),
+    ('ppt', '.ppt', '.pptx'),
+)
+
+
+def _progid_ext(prog_id: Optional[str], ooxml: bool = False, default: Optional[str] = None) -> Optional[str]:
+    """根据ProgId推断扩展名，ooxml=True 时返回 .xlsx/.docx/.pptx"""
+    if not prog_id:
+        return default
+    prog_id_lower = prog_id.lower()
+    for keyword, legacy_ext, ooxml_ext in _PROGID_EXT:
+        if keyword in prog_id_lower:
+            return ooxml_ext if ooxml else legacy_ext
+    return default
+
+
+# Excel相关的OLE2流名关键词
+_XLS_STREAM_RE = re.compile(r'workbook|book|excel|sheet|xls')
+
+
+def _find_streams(stream_list: List[Any], pattern: re.Pattern) -> List[Any]:
+    """按流名（不区分大小写）筛选OLE2流"""
+    matched = []
+    for stream_name in stream_list:
+        if isinstance(stream_name, tuple) and len(stream_name) > 0:
+            name = stream_name[0].lower()
+        else:
+            name = str(stream_name).lower()
+        if pattern.search(name):
+            matched.append(stream_name)
+    return matched
+
 
 class WordDocumentService:
     """Word 文档处理服务"""
     
+    # 图片相关关键词（扩展版），预编译为单个正则
+    _IMAGE_KEYWORDS_RE = re.compile('|'.join(map(re.escape, [
+        '图', '流程图', '示意图', '图片', '图表', '架构图', '时序图',
+        '用例图', '类图', '状态图', '活动图', '部署图', '组件图',
+        'figure', 'image', 'diagram', 'chart', 'flowchart'
+    ])))
+    # Markdown标题前缀（按 # 个数索引，覆盖 Word 标题1-9级加一级偏移）
+    _HEADING_PREFIXES = tuple("#" * count for count in range(11))
+    
+    @staticmethod
+    def _heading_prefix(count: int) -> str:
+        """返回由 count 个 # 组成的标题前缀，超出预生成范围时直接构造"""
+        if 0 <= count < len(WordDocumentService._HEADING_PREFIXES):
+            return WordDocumentService._HEADING_PREFIXES[count]
+        return "#" * count
+    
     @staticmethod
     def _parse_word_document(file_path: str, document_id: str = None) -> Dict[str, Any]:
         """
@@ -33,6 +211,9 @@ class WordDocumentService:
                 "metadata": dict
             }
         """
+        # 每个文档开始解析时清空token估算缓存，避免跨文档累积
+        _estimate_tokens_cached.cache_clear()
+        
         doc = Document(file_path)
         
         result = {
@@ -84,8 +265,11 @@ class WordDocumentService:
             # 这些图片将在后续处理中，根据它们在文档中的出现顺序来推断位置
         
         # 构建章节标题映射（用于图片上下文和描述生成）
+        # 段落列表只物化一次（doc.paragraphs 每次访问都会重新构建列表）
+        paragraphs = list(doc.paragraphs)
+        total_paragraphs = len(paragraphs)
         section_titles = []
-        for para_idx_temp, para in enumerate(doc.paragraphs):
+        for para_idx_temp, para in enumerate(paragraphs):
             if para.style.name.startswith('Heading'):
                 section_titles.append((para_idx_temp, para.text.strip()))
         logger.debug(f"构建章节标题映射: {len(section_titles)} 个章节")
@@ -177,13 +361,13 @@ class WordDocumentService:
                             prev_paras_text = []
                             next_paras_text = []
                             for i in range(max(0, para_idx - 2), para_idx):
-                                if i < len(doc.paragraphs):
-                                    prev_text = doc.paragraphs[i].text.strip()
+                                if i < total_paragraphs:
+                                    prev_text = paragraphs[i].text.strip()
                                     if prev_text:
                                         prev_paras_text.append(prev_text)
-                            for i in range(para_idx + 1, min(para_idx + 3, len(doc.paragraphs))):
-                                if i < len(doc.paragraphs):
-                                    next_text = doc.paragraphs[i].text.strip()
+                            for i in range(para_idx + 1, min(para_idx + 3, total_paragraphs)):
+                                if i < total_paragraphs:
+                                    next_text = paragraphs[i].text.strip()
                                     if next_text:
                                         next_paras_text.append(next_text)
                             
@@ -200,7 +384,6 @@ class WordDocumentService:
                             )
                             
                             # 计算相对位置
-                            total_paragraphs = len(doc.paragraphs)
                             relative_position = para_idx / total_paragraphs if total_paragraphs > 0 else 0.0
                             
                             img["position"] = para_idx
@@ -224,7 +407,7 @@ class WordDocumentService:
                 if text:
                     # 添加到结构化内容
                     result["structured_content"].append({
-                        "type": "heading" if is_heading else "paragraph",
+                        "type": _T_HEADING if is_heading else _T_PARAGRAPH,
                         "level": heading_level if is_heading else 0,
                         "text": text,
                         "links": links,
@@ -248,7 +431,7 @@ class WordDocumentService:
                 # 如果段落没有文本但有图片或OLE对象，单独记录
                 elif images_in_para or ole_in_para:
                     result["structured_content"].append({
-                        "type": "image_only" if images_in_para else "ole_only",
+                        "type": _T_IMAGE if images_in_para else _T_OLE,
                         "level": 0,
                         "text": "",
                         "links": links,
@@ -278,7 +461,7 @@ class WordDocumentService:
                 table_text = WordDocumentService._format_table_as_text(table_data)
                 result["text_content"] += table_text + "\n"
                 result["structured_content"].append({
-                    "type": "table",
+                    "type": _T_TABLE,
                     "data": table_data,
                     "text": table_text,
                     "table_id": table_id  # 保存table_id
@@ -796,6 +979,18 @@ class WordDocumentService:
             "col_count": len(headers)
         }
     
+    @staticmethod
+    def _write_bytes(path: str, data: bytes) -> None:
+        """一次性写入字节数据（直接使用文件描述符，跳过缓冲IO层）"""
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            view = memoryview(data)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+        finally:
+            os.close(fd)
+    
     @staticmethod
     def _detect_file_format(file_content: bytes, original_path: str, save_dir: str, ole_id: str, prog_id: str = None) -> str:
         """
@@ -814,10 +1009,10 @@ class WordDocumentService:
         if len(file_content) < 8:
             return '.bin'
         
-        header = file_content[:8]
+        container = _detect_container(file_content)
         
         # 检查是否是ZIP格式（.xlsx, .docx, .pptx实际上是ZIP）
-        if header[:2] == b'PK':
+        if container == 'zip':
             # 尝试作为ZIP打开，检查文件类型
             try:
                 import zipfile
@@ -826,25 +1021,23 @@ class WordDocumentService:
                     file_list = zf.namelist()
                     # 检查是否包含Excel的特征文件
                     if any('xl/' in name or 'xl/workbook' in name or 'xl/worksheets' in name for name in file_list):
-                        logger.info(f"检测到Excel格式（.xlsx）: {ole_id}")
+                        logger.info("检测到Excel格式（.xlsx）: %s", ole_id)
                         return '.xlsx'
                     # 检查是否包含Word的特征文件
                     elif any('word/' in name or 'word/document' in name for name in file_list):
-                        logger.info(f"检测到Word格式（.docx）: {ole_id}")
+                        logger.info("检测到Word格式（.docx）: %s", ole_id)
                         return '.docx'
                     # 检查是否包含PowerPoint的特征文件
                     elif any('ppt/' in name or 'ppt/presentation' in name or 'ppt/slides' in name for name in file_list):
-                        logger.info(f"检测到PowerPoint格式（.pptx）: {ole_id}")
+                        logger.info("检测到PowerPoint格式（.pptx）: %s", ole_id)
                         return '.pptx'
             except Exception as e:
-                logger.debug(f"ZIP格式检测失败: {e}")
+                logger.debug("ZIP格式检测失败: %s", e)
             # 如果是ZIP但不是已知的Office格式，返回.zip
             return '.zip'
         
         # 检查是否是OLE2格式（Composite Document File V2）
-        # OLE2签名: D0 CF 11 E0 A1 B1 1A E1
-        ole2_signature = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
-        if header == ole2_signature:
+        if container == 'ole2':
             # 这是OLE2格式，尝试使用olefile库提取内容
             try:
                 import olefile
@@ -867,7 +1060,7 @@ class WordDocumentService:
                                 all_streams_debug.append('/'.join(s))
                             else:
                                 all_streams_debug.append(str(s))
-                        logger.info(f"OLE2文件中的所有流: {all_streams_debug}")
+                        logger.info("OLE2文件中的所有流: %s", all_streams_debug)
                         
                         # 检查Excel流
                         for stream_name in stream_list:
@@ -908,14 +1101,8 @@ class WordDocumentService:
                                     break
                         
                         # 如果通过流名无法判断，尝试根据ProgId判断
-                        if not detected_type and prog_id:
-                            prog_id_lower = prog_id.lower()
-                            if 'excel' in prog_id_lower:
-                                detected_type = '.xls'
-                            elif 'word' in prog_id_lower:
-                                detected_type = '.doc'
-                            elif 'powerpoint' in prog_id_lower or 'ppt' in prog_id_lower:
-                                detected_type = '.ppt'
+                        if not detected_type:
+                            detected_type = _progid_ext(prog_id)
                         
                         # 如果找到了类型，提取内容
                         if detected_type and stream_name_used:
@@ -936,21 +1123,20 @@ class WordDocumentService:
                                     extracted_data = ole.openstream(actual_stream_name).read()
                                     # 保存提取的内容
                                     extracted_path = os.path.join(save_dir, f"{ole_id}{detected_type}")
-                                    with open(extracted_path, 'wb') as f:
-                                        f.write(extracted_data)
-                                    logger.info(f"✓ 成功从OLE2格式提取{detected_type}内容: {extracted_path}, 流名: {stream_name_used}")
+                                    WordDocumentService._write_bytes(extracted_path, extracted_data)
+                                    logger.info("✓ 成功从OLE2格式提取%s内容: %s, 流名: %s", detected_type, extracted_path, stream_name_used)
                                     ole.close()
                                     return detected_type
                                 else:
-                                    logger.warning(f"✗ 找不到流对象: {stream_name_used}, 可用流: {all_streams_debug}")
+                                    logger.warning("✗ 找不到流对象: %s, 可用流: %s", stream_name_used, all_streams_debug)
                             except Exception as e:
-                                logger.warning(f"✗ 提取{detected_type}内容失败: {e}", exc_info=True)
+                                logger.warning("✗ 提取%s内容失败: %s", detected_type, e, exc_info=True)
                         
                         # 如果找不到标准流，检查是否有package流（打包的OLE对象）
                         # 即使detected_type存在，如果没有stream_name_used，也要检查package流
                         if not stream_name_used:
                             package_stream = None
-                            logger.info(f"开始查找package流，流列表类型: {type(stream_list)}, 数量: {len(stream_list)}")
+                            logger.info("开始查找package流，流列表类型: %s, 数量: %s", type(stream_list), len(stream_list))
                             for idx, stream_name in enumerate(stream_list):
                                 # 处理流名（可能是tuple或字符串）
                                 stream_first_str = None
@@ -980,7 +1166,7 @@ class WordDocumentService:
                                     else:
                                         stream_first_str = str(stream_name).strip()
                                 
-                                logger.info(f"流[{idx}]: {stream_name} -> {stream_first_str} ({stream_type_info})")
+                                logger.info("流[%s]: %s -> %s (%s)", idx, stream_name, stream_first_str, stream_type_info)
                                 
                                 # 检查是否是package流（不区分大小写，去除空白字符）
                                 # 也检查流名的字符串表示中是否包含'package'
@@ -989,98 +1175,77 @@ class WordDocumentService:
                                     stream_repr = repr(stream_name).lower()
                                     if stream_lower == 'package' or 'package' in stream_lower or 'package' in stream_repr:
                                         package_stream = stream_name
-                                        logger.info(f"✓✓✓ 找到package流: {package_stream} (原始: {stream_first_str}, repr: {stream_repr})")
+                                        logger.info("✓✓✓ 找到package流: %s (原始: %s, repr: %s)", package_stream, stream_first_str, stream_repr)
                                         break
                             
                             if package_stream:
-                                logger.info(f"找到package流，尝试提取内容: {package_stream}")
+                                logger.info("找到package流，尝试提取内容: %s", package_stream)
                                 try:
                                     package_data = ole.openstream(package_stream).read()
                                     
-                                    # 检查提取的数据格式
-                                    if len(package_data) >= 2 and package_data[:2] == b'PK':
+                                    # 检查提取的数据格式（只判断一次容器类型）
+                                    package_container = _detect_container(package_data)
+                                    if package_container == 'zip':
                                         # ZIP格式，可能是.xlsx、.docx或.pptx文件，需要进一步判断
                                         try:
                                             import zipfile
                                             import io
                                             with zipfile.ZipFile(io.BytesIO(package_data), 'r') as zf:
-                                                file_list = zf.namelist()
-                                                # 检查是否包含Excel的特征文件
-                                                if any('xl/' in name or 'xl/workbook' in name or 'xl/worksheets' in name for name in file_list):
-                                                    extracted_path = os.path.join(save_dir, f"{ole_id}.xlsx")
-                                                    with open(extracted_path, 'wb') as f:
-                                                        f.write(package_data)
-                                                    logger.info(f"从package流提取到.xlsx格式文件: {extracted_path}")
-                                                    ole.close()
-                                                    return '.xlsx'
-                                                # 检查是否包含Word的特征文件
-                                                elif any('word/' in name or 'word/document' in name for name in file_list):
-                                                    extracted_path = os.path.join(save_dir, f"{ole_id}.docx")
-                                                    with open(extracted_path, 'wb') as f:
-                                                        f.write(package_data)
-                                                    logger.info(f"从package流提取到.docx格式文件: {extracted_path}")
-                                                    ole.close()
-                                                    return '.docx'
-                                                # 检查是否包含PowerPoint的特征文件
-                                                elif any('ppt/' in name or 'ppt/presentation' in name or 'ppt/slides' in name for name in file_list):
-                                                    extracted_path = os.path.join(save_dir, f"{ole_id}.pptx")
-                                                    with open(extracted_path, 'wb') as f:
-                                                        f.write(package_data)
-                                                    logger.info(f"从package流提取到.pptx格式文件: {extracted_path}")
-                                                    ole.close()
-                                                    return '.pptx'
-                                                else:
-                                                    # 无法识别，根据ProgId判断
-                                                    if prog_id:
-                                                        prog_id_lower = prog_id.lower()
-                                                        if 'excel' in prog_id_lower:
-                                                            extracted_path = os.path.join(save_dir, f"{ole_id}.xlsx")
-                                                            with open(extracted_path, 'wb') as f:
-                                                                f.write(package_data)
-                                                            logger.info(f"从package流提取数据，根据ProgId判断为.xlsx: {extracted_path}")
-                                                            ole.close()
-                                                            return '.xlsx'
-                                                        elif 'word' in prog_id_lower:
-                                                            extracted_path = os.path.join(save_dir, f"{ole_id}.docx")
-                                                            with open(extracted_path, 'wb') as f:
-                                                                f.write(package_data)
-                                                            logger.info(f"从package流提取数据，根据ProgId判断为.docx: {extracted_path}")
-                                                            ole.close()
-                                                            return '.docx'
-                                                        elif 'powerpoint' in prog_id_lower or 'ppt' in prog_id_lower:
-                                                            extracted_path = os.path.join(save_dir, f"{ole_id}.pptx")
-                                                            with open(extracted_path, 'wb') as f:
-                                                                f.write(package_data)
-                                                            logger.info(f"从package流提取数据，根据ProgId判断为.pptx: {extracted_path}")
-                                                            ole.close()
-                                                            return '.pptx'
-                                                    # 如果无法判断，默认保存为.xlsx（向后兼容）
-                                                    extracted_path = os.path.join(save_dir, f"{ole_id}.xlsx")
-                                                    with open(extracted_path, 'wb') as f:
-                                                        f.write(package_data)
-                                                    logger.warning(f"从package流提取ZIP数据，无法识别格式，默认保存为.xlsx: {extracted_path}")
+                                                # 只解析一次中央目录，取出顶层目录集合后立即关闭
+                                                inner_top_dirs = {name.split('/', 1)[0] for name in zf.namelist()}
+                                            # 检查是否包含Excel的特征文件
+                                            if 'xl' in inner_top_dirs:
+                                                extracted_path = os.path.join(save_dir, f"{ole_id}.xlsx")
+                                                WordDocumentService._write_bytes(extracted_path, package_data)
+                                                logger.info("从package流提取到.xlsx格式文件: %s", extracted_path)
+                                                ole.close()
+                                                return '.xlsx'
+                                            # 检查是否包含Word的特征文件
+                                            elif 'word' in inner_top_dirs:
+                                                extracted_path = os.path.join(save_dir, f"{ole_id}.docx")
+                                                WordDocumentService._write_bytes(extracted_path, package_data)
+                                                logger.info("从package流提取到.docx格式文件: %s", extracted_path)
+                                                ole.close()
+                                                return '.docx'
+                                            # 检查是否包含PowerPoint的特征文件
+                                            elif 'ppt' in inner_top_dirs:
+                                                extracted_path = os.path.join(save_dir, f"{ole_id}.pptx")
+                                                WordDocumentService._write_bytes(extracted_path, package_data)
+                                                logger.info("从package流提取到.pptx格式文件: %s", extracted_path)
+                                                ole.close()
+                                                return '.pptx'
+                                            else:
+                                                # 无法识别，根据ProgId判断
+                                                progid_ext = _progid_ext(prog_id, ooxml=True)
+                                                if progid_ext:
+                                                    extracted_path = os.path.join(save_dir, f"{ole_id}{progid_ext}")
+                                                    WordDocumentService._write_bytes(extracted_path, package_data)
+                                                    logger.info("从package流提取数据，根据ProgId判断为%s: %s", progid_ext, extracted_path)
                                                     ole.close()
-                                                    return '.xlsx'
+                                                    return progid_ext
+                                                # 如果无法判断，默认保存为.xlsx（向后兼容）
+                                                extracted_path = os.path.join(save_dir, f"{ole_id}.xlsx")
+                                                WordDocumentService._write_bytes(extracted_path, package_data)
+                                                logger.warning("从package流提取ZIP数据，无法识别格式，默认保存为.xlsx: %s", extracted_path)
+                                                ole.close()
+                                                return '.xlsx'
                                         except Exception as e:
-                                            logger.warning(f"检查ZIP文件内容失败: {e}，根据ProgId判断")
+                                            logger.warning("检查ZIP文件内容失败: %s，根据ProgId判断", e)
                                             # 如果检查失败，根据ProgId判断
-                                            if prog_id:
-                                                prog_id_lower = prog_id.lower()
-                                                if 'word' in prog_id_lower:
-                                                    extracted_path = os.path.join(save_dir, f"{ole_id}.docx")
-                                                    with open(extracted_path, 'wb') as f:
-                                                        f.write(package_data)
-                                                    logger.info(f"从package流提取数据，根据ProgId判断为.docx: {extracted_path}")
-                                                    ole.close()
-                                                    return '.docx'
+                                            progid_ext = _progid_ext(prog_id, ooxml=True)
+                                            if progid_ext:
+                                                extracted_path = os.path.join(save_dir, f"{ole_id}{progid_ext}")
+                                                WordDocumentService._write_bytes(extracted_path, package_data)
+                                                logger.info("从package流提取数据，根据ProgId判断为%s: %s", progid_ext, extracted_path)
+                                                ole.close()
+                                                return progid_ext
                                             # 默认保存为.xlsx
                                             extracted_path = os.path.join(save_dir, f"{ole_id}.xlsx")
-                                            with open(extracted_path, 'wb') as f:
-                                                f.write(package_data)
-                                            logger.warning(f"从package流提取ZIP数据，检查失败，默认保存为.xlsx: {extracted_path}")
+                                            WordDocumentService._write_bytes(extracted_path, package_data)
+                                            logger.warning("从package流提取ZIP数据，检查失败，默认保存为.xlsx: %s", extracted_path)
                                             ole.close()
                                             return '.xlsx'
-                                    elif len(package_data) >= 8 and package_data[:8] == b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1':
+                                    elif package_container == 'ole2':
                                         # OLE2格式，可能是.xls文件，尝试提取Workbook流
                                         try:
                                             import io
@@ -1097,9 +1262,8 @@ class WordDocumentService:
                                                 if pkg_stream_first.lower() in ['workbook', 'book']:
                                                     workbook_data = package_ole.openstream(pkg_stream).read()
                                                     extracted_path = os.path.join(save_dir, f"{ole_id}.xls")
-                                                    with open(extracted_path, 'wb') as f:
-                                                        f.write(workbook_data)
-                                                    logger.info(f"从package流的OLE2格式中提取Workbook流: {extracted_path}")
+                                                    WordDocumentService._write_bytes(extracted_path, workbook_data)
+                                                    logger.info("从package流的OLE2格式中提取Workbook流: %s", extracted_path)
                                                     package_ole.close()
                                                     ole.close()
                                                     workbook_found = True
@@ -1108,60 +1272,47 @@ class WordDocumentService:
                                             if not workbook_found:
                                                 # 如果找不到Workbook流，直接保存package数据为.xls
                                                 extracted_path = os.path.join(save_dir, f"{ole_id}.xls")
-                                                with open(extracted_path, 'wb') as f:
-                                                    f.write(package_data)
-                                                logger.info(f"从package流提取OLE2数据，保存为.xls: {extracted_path}")
+                                                WordDocumentService._write_bytes(extracted_path, package_data)
+                                                logger.info("从package流提取OLE2数据，保存为.xls: %s", extracted_path)
                                                 package_ole.close()
                                                 ole.close()
                                                 return '.xls'
                                         except Exception as e:
-                                            logger.warning(f"从package流的OLE2格式提取Workbook失败: {e}")
+                                            logger.warning("从package流的OLE2格式提取Workbook失败: %s", e)
                                             # 如果提取失败，直接保存package数据
                                             extracted_path = os.path.join(save_dir, f"{ole_id}.xls")
-                                            with open(extracted_path, 'wb') as f:
-                                                f.write(package_data)
-                                            logger.info(f"从package流提取数据，保存为.xls: {extracted_path}")
+                                            WordDocumentService._write_bytes(extracted_path, package_data)
+                                            logger.info("从package流提取数据，保存为.xls: %s", extracted_path)
                                             ole.close()
                                             return '.xls'
                                     else:
                                         # 其他格式，根据ProgId判断
                                         if prog_id and 'excel' in prog_id.lower():
                                             extracted_path = os.path.join(save_dir, f"{ole_id}.xls")
-                                            with open(extracted_path, 'wb') as f:
-                                                f.write(package_data)
-                                            logger.info(f"从package流提取数据，根据ProgId判断为.xls: {extracted_path}")
+                                            WordDocumentService._write_bytes(extracted_path, package_data)
+                                            logger.info("从package流提取数据，根据ProgId判断为.xls: %s", extracted_path)
                                             ole.close()
                                             return '.xls'
                                         else:
                                             # 如果无法识别格式，但ProgId显示是Excel，尝试直接保存为.xls
                                             if prog_id and 'excel' in prog_id.lower():
                                                 extracted_path = os.path.join(save_dir, f"{ole_id}.xls")
-                                                with open(extracted_path, 'wb') as f:
-                                                    f.write(package_data)
-                                                logger.info(f"从package流提取数据，根据ProgId判断为.xls: {extracted_path}")
+                                                WordDocumentService._write_bytes(extracted_path, package_data)
+                                                logger.info("从package流提取数据，根据ProgId判断为.xls: %s", extracted_path)
                                                 ole.close()
                                                 return '.xls'
                                             else:
-                                                logger.warning(f"无法识别package流中的数据格式，ProgId: {prog_id}")
+                                                logger.warning("无法识别package流中的数据格式，ProgId: %s", prog_id)
                                 except Exception as e:
-                                    logger.warning(f"从package流提取内容失败: {e}", exc_info=True)
+                                    logger.warning("从package流提取内容失败: %s", e, exc_info=True)
                         
                         # 如果无法提取，但能判断类型，尝试其他方法
                         # 注意：只有在没有找到package流或package流提取失败时才执行
                         if detected_type and not stream_name_used:
-                            logger.warning(f"✗ 检测到OLE2格式的{detected_type}文件，但无法提取标准流，尝试查找所有可能的流...")
+                            logger.warning("✗ 检测到OLE2格式的%s文件，但无法提取标准流，尝试查找所有可能的流...", detected_type)
                             
                             # 尝试查找所有可能的Excel流名（不区分大小写）
-                            possible_streams = []
-                            for stream_name in stream_list:
-                                if isinstance(stream_name, tuple) and len(stream_name) > 0:
-                                    stream_name_str = stream_name[0].lower()
-                                else:
-                                    stream_name_str = str(stream_name).lower()
-                                
-                                # 检查是否包含excel相关的关键词
-                                if any(keyword in stream_name_str for keyword in ['workbook', 'book', 'excel', 'sheet', 'xls']):
-                                    possible_streams.append(stream_name)
+                            possible_streams = _find_streams(stream_list, _XLS_STREAM_RE)
                             
                             if possible_streams:
                                 # 尝试使用第一个可能的流
@@ -1169,89 +1320,67 @@ class WordDocumentService:
                                     stream_to_try = possible_streams[0]
                                     extracted_data = ole.openstream(stream_to_try).read()
                                     extracted_path = os.path.join(save_dir, f"{ole_id}{detected_type}")
-                                    with open(extracted_path, 'wb') as f:
-                                        f.write(extracted_data)
-                                    logger.info(f"✓ 使用备用流提取{detected_type}内容成功: {extracted_path}, 流名: {stream_to_try}")
+                                    WordDocumentService._write_bytes(extracted_path, extracted_data)
+                                    logger.info("✓ 使用备用流提取%s内容成功: %s, 流名: %s", detected_type, extracted_path, stream_to_try)
                                     ole.close()
                                     return detected_type
                                 except Exception as e:
-                                    logger.warning(f"✗ 使用备用流提取失败: {e}")
+                                    logger.warning("✗ 使用备用流提取失败: %s", e)
                             
                             # 如果所有方法都失败，返回.bin
-                            logger.warning(f"✗ 所有提取方法都失败，将保存为.bin格式: {ole_id}, 可用流: {all_streams_debug}")
+                            logger.warning("✗ 所有提取方法都失败，将保存为.bin格式: %s, 可用流: %s", ole_id, all_streams_debug)
                             ole.close()
                             return '.bin'  # 返回.bin，表示无法提取为标准格式
                         
                         # 如果既没有找到标准流，也没有找到package流，但ProgId显示是Excel，尝试查找所有流
                         if not stream_name_used and prog_id and 'excel' in prog_id.lower():
-                            logger.warning(f"✗ 根据ProgId判断为Excel，但无法提取流，尝试查找所有可能的流...")
+                            logger.warning("✗ 根据ProgId判断为Excel，但无法提取流，尝试查找所有可能的流...")
                             
                             # 尝试查找所有可能的Excel流
-                            possible_streams = []
-                            for stream_name in stream_list:
-                                if isinstance(stream_name, tuple) and len(stream_name) > 0:
-                                    stream_name_str = stream_name[0].lower()
-                                else:
-                                    stream_name_str = str(stream_name).lower()
-                                
-                                if any(keyword in stream_name_str for keyword in ['workbook', 'book', 'excel', 'sheet', 'xls']):
-                                    possible_streams.append(stream_name)
+                            possible_streams = _find_streams(stream_list, _XLS_STREAM_RE)
                             
                             if possible_streams:
                                 try:
                                     stream_to_try = possible_streams[0]
                                     extracted_data = ole.openstream(stream_to_try).read()
                                     extracted_path = os.path.join(save_dir, f"{ole_id}.xls")
-                                    with open(extracted_path, 'wb') as f:
-                                        f.write(extracted_data)
-                                    logger.info(f"✓ 使用备用流提取.xls内容成功: {extracted_path}, 流名: {stream_to_try}")
+                                    WordDocumentService._write_bytes(extracted_path, extracted_data)
+                                    logger.info("✓ 使用备用流提取.xls内容成功: %s, 流名: %s", extracted_path, stream_to_try)
                                     ole.close()
                                     return '.xls'
                                 except Exception as e:
-                                    logger.warning(f"✗ 使用备用流提取失败: {e}")
+                                    logger.warning("✗ 使用备用流提取失败: %s", e)
                             
-                            logger.warning(f"✗ 所有提取方法都失败，将保存为.bin格式: {ole_id}, 可用流: {all_streams_debug}")
+                            logger.warning("✗ 所有提取方法都失败，将保存为.bin格式: %s, 可用流: %s", ole_id, all_streams_debug)
                             ole.close()
                             return '.bin'  # 返回.bin，表示无法提取为标准格式
                         
                     except Exception as e:
-                        logger.warning(f"从OLE2格式提取内容失败: {e}", exc_info=True)
+                        logger.warning("从OLE2格式提取内容失败: %s", e, exc_info=True)
                     finally:
                         ole.close()
             except ImportError:
                 logger.warning("olefile库未安装，无法提取OLE2格式中的内容。请安装: pip install olefile")
             except Exception as e:
-                logger.debug(f"检测OLE2格式失败: {e}")
+                logger.debug("检测OLE2格式失败: %s", e)
             
             # 如果无法提取，但能根据ProgId判断类型，返回对应扩展名
-            if prog_id:
-                prog_id_lower = prog_id.lower()
-                if 'excel' in prog_id_lower:
-                    logger.info(f"根据ProgId判断为Excel格式: {prog_id}")
-                    return '.xls'
-                elif 'word' in prog_id_lower:
-                    logger.info(f"根据ProgId判断为Word格式: {prog_id}")
-                    return '.doc'
-                elif 'powerpoint' in prog_id_lower or 'ppt' in prog_id_lower:
-                    logger.info(f"根据ProgId判断为PowerPoint格式: {prog_id}")
-                    return '.ppt'
+            progid_ext = _progid_ext(prog_id)
+            if progid_ext:
+                logger.info("根据ProgId判断为%s格式: %s", progid_ext, prog_id)
+                return progid_ext
             
             # 如果无法判断，返回.bin
-            logger.warning(f"无法识别OLE2格式的文件类型，返回.bin格式: {ole_id}")
+            logger.warning("无法识别OLE2格式的文件类型，返回.bin格式: %s", ole_id)
             return '.bin'
         
-        # 检查是否是旧版Excel格式（.xls）
-        # 旧版Excel也是OLE2格式，但可能没有标准的OLE2签名
-        if b'Microsoft Excel' in file_content[:1024] or b'Workbook' in file_content[:1024]:
-            return '.xls'
-        
-        # 检查是否是Word格式
-        if b'Microsoft Word' in file_content[:1024] or b'WordDocument' in file_content[:1024]:
-            return '.doc'
-        
-        # 检查是否是PowerPoint格式
-        if b'Microsoft PowerPoint' in file_content[:1024] or b'PowerPoint' in file_content[:1024]:
-            return '.ppt'
+        # 检查是否是旧版Excel/Word/PowerPoint格式（.xls/.doc/.ppt）
+        # 旧版Office也是OLE2格式，但可能没有标准的OLE2签名
+        found_sigs = set(_OLE_TEXT_SIG_RE.findall(file_content[:1024]))
+        if found_sigs:
+            for sigs, ext in _OLE_TEXT_SIG_EXT:
+                if not found_sigs.isdisjoint(sigs):
+                    return ext
         
         # 默认返回原始扩展名或.bin
         original_ext = os.path.splitext(original_path)[1].lower()
@@ -1260,14 +1389,7 @@ class WordDocumentService:
         
         # 如果原始路径没有扩展名，但ProgId有信息，尝试根据ProgId判断
         if not original_ext or original_ext == '':
-            if prog_id:
-                prog_id_lower = prog_id.lower()
-                if 'excel' in prog_id_lower:
-                    return '.xls'
-                elif 'word' in prog_id_lower:
-                    return '.doc'
-                elif 'powerpoint' in prog_id_lower or 'ppt' in prog_id_lower:
-                    return '.ppt'
+            return _progid_ext(prog_id, default='.bin')
         
         return '.bin'
     
@@ -1287,36 +1409,31 @@ class WordDocumentService:
         3. 如果章节标题包含图片相关关键词，使用章节标题
         4. 否则，使用段落文本的前50字符
         """
-        # 图片相关关键词（扩展版）
-        image_keywords = [
-            '图', '流程图', '示意图', '图片', '图表', '架构图', '时序图', 
-            '用例图', '类图', '状态图', '活动图', '部署图', '组件图',
-            'figure', 'image', 'diagram', 'chart', 'flowchart'
-        ]
+        keywords_re = WordDocumentService._IMAGE_KEYWORDS_RE
         
         # 策略1：检查当前段落
         if para_text:
             para_lower = para_text.lower()
-            if any(keyword in para_lower for keyword in image_keywords):
+            if keywords_re.search(para_lower):
                 # 提取包含关键词的句子
-                sentences = para_text.split('。') + para_text.split('.')
-                for sentence in sentences:
-                    sentence_lower = sentence.lower()
-                    if any(keyword in sentence_lower for keyword in image_keywords):
-                        return sentence.strip()[:100]
+                # 先按中文句号分句，找不到再按英文句号分句（避免切断"图3.1"这类编号）
+                for separator in ('。', '.'):
+                    for sentence in para_text.split(separator):
+                        if keywords_re.search(sentence.lower()):
+                            return sentence.strip()[:100]
                 return para_text[:100]
         
         # 策略2：检查前一段落
         if prev_paras_text:
             for prev_text in reversed(prev_paras_text):
                 prev_lower = prev_text.lower()
-                if any(keyword in prev_lower for keyword in image_keywords):
+                if keywords_re.search(prev_lower):
                     return f"位于段落：{prev_text[:80]}"
         
         # 策略3：检查章节标题
         if section_title:
             section_lower = section_title.lower()
-            if any(keyword in section_lower for keyword in image_keywords):
+            if keywords_re.search(section_lower):
                 return f"{section_title}中的图片"
         
         # 策略4：使用当前段落文本（如果存在）
@@ -1337,14 +1454,29 @@ class WordDocumentService:
             return ""
         
         # 构建表格文本
-        text = "表格：\n"
-        text += " | ".join(table_data["headers"]) + "\n"
-        text += "-" * (len(" | ".join(table_data["headers"]))) + "\n"
+        header_line = " | ".join(table_data["headers"])
+        lines = ["表格：", header_line, "-" * len(header_line)]
+        lines.extend([" | ".join(row) for row in table_data.get("rows", [])])
         
-        for row in table_data.get("rows", []):
-            text += " | ".join(row) + "\n"
+        return "\n".join(lines) + "\n"
+    
+    @staticmethod
+    def _get_table_markdown(table_data: Dict, table_markdown_cache: Optional[Dict[str, str]] = None) -> str:
+        """
+        获取表格的Markdown文本
         
-        return text
+        调用方传入table_markdown_cache时按table_id复用已格式化的结果，
+        同一次处理中章节内容和表格Episode共用一份缓存，每个表格只格式化一次
+        """
+        table_id = table_data.get("table_id") if table_data else None
+        if table_markdown_cache is None or not table_id:
+            return WordDocumentService._format_table_as_markdown(table_data)
+        
+        table_markdown = table_markdown_cache.get(table_id)
+        if table_markdown is None:
+            table_markdown = WordDocumentService._format_table_as_markdown(table_data)
+            table_markdown_cache[table_id] = table_markdown
+        return table_markdown
     
     @staticmethod
     def _format_table_as_markdown(table_data: Dict) -> str:
@@ -1367,24 +1499,34 @@ class WordDocumentService:
         
         headers = table_data["headers"]
         rows = table_data.get("rows", [])
+        col_count = len(headers)
         
         # 构建标准Markdown表格
-        # 表头行
-        markdown = "| " + " | ".join(str(header) for header in headers) + " |\n"
-        # 分隔行（标准Markdown表格格式）
-        markdown += "| " + " | ".join(["---"] * len(headers)) + " |\n"
+        parts = [
+            # 表头行
+            "| {} |".format(" | ".join([str(header) for header in headers])),
+            # 分隔行（标准Markdown表格格式）
+            "| {} |".format(" | ".join(["---"] * col_count)),
+        ]
         
         # 数据行
         for row in rows:
-            # 确保行数据长度与表头一致
-            row_data = row[:len(headers)] if row else []
-            if len(row_data) < len(headers):
-                row_data.extend([""] * (len(headers) - len(row_data)))
             # 转义表格中的管道符，避免破坏表格结构
-            escaped_row = [str(cell).replace("|", "\\|") for cell in row_data]
-            markdown += "| " + " | ".join(escaped_row) + " |\n"
+            escaped_row = [str(cell).translate(_PIPE_TRANS) for cell in row[:col_count]] if row else []
+            # 确保行数据长度与表头一致
+            if len(escaped_row) < col_count:
+                escaped_row.extend([""] * (col_count - len(escaped_row)))
+            parts.append("| {} |".format(" | ".join(escaped_row)))
         
-        return markdown
+        return "\n".join(parts) + "\n"
+    
+    @staticmethod
+    def _save_zip_member(zip_file, member: str, target_path: str) -> int:
+        """将zip中的单个文件保存到磁盘，返回写入的字节数"""
+        data = zip_file.read(member)
+        with open(target_path, 'wb') as target:
+            target.write(data)
+        return len(data)
     
     @staticmethod
     def _extract_images_from_document(doc: Document, document_id: str = None, file_path: str = None) -> List[Dict]:
@@ -1408,9 +1550,7 @@ class WordDocumentService:
             "unmatched": 0
         }
         try:
-            from docx.oxml.ns import qn
             import zipfile
-            import shutil
             
             image_counter = 0
             
@@ -1432,17 +1572,24 @@ class WordDocumentService:
                 try:
                     # 首先读取关系文件，建立关系ID到图片文件的映射
                     with zipfile.ZipFile(file_path, 'r') as zip_file:
+                        # 缓存zip条目名集合，图片存在性检查为O(1)
+                        zip_names = set(zip_file.namelist())
+                        
                         # 读取document.xml.rels文件，建立关系ID到图片文件的映射
                         try:
                             rels_file = zip_file.read('word/_rels/document.xml.rels')
-                            import xml.etree.ElementTree as ET
-                            rels_root = ET.fromstring(rels_file)
                             
-                            # 解析关系文件，找到所有图片关系
-                            for rel in rels_root.findall('.//{http://schemas.openxmlformats.org/package/2006/relationships}Relationship'):
+                            debug_enabled = logger.isEnabledFor(logging.DEBUG)
+                            
+                            # 流式解析关系文件，找到所有图片关系（解析完即释放元素，避免构建完整DOM）
+                            for _, rel in etree.iterparse(
+                                io.BytesIO(rels_file),
+                                tag='{http://schemas.openxmlformats.org/package/2006/relationships}Relationship'
+                            ):
                                 rel_type = rel.get('Type', '')
                                 target = rel.get('Target', '')
                                 rel_id = rel.get('Id', '')
+                                rel.clear()
                                 
                                 # 如果是图片关系
                                 if 'image' in rel_type.lower() or target.startswith('media/'):
@@ -1454,29 +1601,49 @@ class WordDocumentService:
                                     
                                     rel_id_to_image_file[rel_id] = image_file_path
                                     image_file_to_rel_id[image_file_path] = rel_id
-                                    logger.debug(f"建立关系映射: rId={rel_id} -> {image_file_path}")
+                                    if debug_enabled:
+                                        logger.debug("建立关系映射: rId=%s -> %s", rel_id, image_file_path)
                         except Exception as e:
-                            logger.warning(f"读取关系文件失败: {e}，将使用备用方法")
+                            logger.warning("读取关系文件失败: %s，将使用备用方法", e)
                         
                         # 直接解析文档结构，找到所有图片出现的位置
                         # 不需要预先查找所有图片文件，而是遍历文档时遇到图片就提取
                         
-                        logger.info(f"📋 建立关系映射: {len(rel_id_to_image_file)} 个图片关系")
+                        logger.info("📋 建立关系映射: %s 个图片关系", len(rel_id_to_image_file))
+                        
+                        # 预先解析每个关系对应的扩展名和文件名，避免在图片循环中重复解析路径
+                        rel_id_to_ext = {rid: (os.path.splitext(p)[1] or '.png') for rid, p in rel_id_to_image_file.items()}
+                        rel_id_to_basename = {rid: os.path.basename(p) for rid, p in rel_id_to_image_file.items()}
+                        image_dir_rel = f"extracted_images/{document_id}" if document_id else "extracted_images/temp"
                         
                         # 现在遍历文档段落，按照图片在文档中出现的顺序分配image_id
                         # 构建章节标题映射（用于上下文增强）
+                        paragraphs = list(doc.paragraphs)
                         section_titles = []
                         current_section_title = ""
-                        for para_idx, para in enumerate(doc.paragraphs):
+                        for para_idx, para in enumerate(paragraphs):
                             if para.style.name.startswith('Heading'):
                                 current_section_title = para.text.strip()
                                 section_titles.append((para_idx, current_section_title))
                         
                         # 计算文档总段落数（用于相对位置计算）
-                        total_paragraphs = len(doc.paragraphs)
+                        total_paragraphs = len(paragraphs)
+                        
+                        # 预计算每个段落对应的最近章节标题（一次正向扫描，避免每个段落反向遍历章节列表）
+                        nearest_title_by_para = []
+                        current_title = ""
+                        title_idx = 0
+                        for i in range(total_paragraphs):
+                            while title_idx < len(section_titles) and section_titles[title_idx][0] == i:
+                                current_title = section_titles[title_idx][1]
+                                title_idx += 1
+                            nearest_title_by_para.append(current_title)
+                        
+                        # 待保存的图片：(images中的索引, zip内路径, 保存路径)
+                        extract_tasks = []
                         
                         # 遍历所有段落，找到图片出现的位置（按文档顺序）
-                        for para_idx, paragraph in enumerate(doc.paragraphs):
+                        for para_idx, paragraph in enumerate(paragraphs):
                             para_text = paragraph.text.strip()
                             
                             # 获取前后多个段落的文本作为上下文
@@ -1484,36 +1651,32 @@ class WordDocumentService:
                             next_paras_text = []
                             
                             for i in range(max(0, para_idx - 2), para_idx):
-                                if i < len(doc.paragraphs):
-                                    prev_text = doc.paragraphs[i].text.strip()
+                                if i < total_paragraphs:
+                                    prev_text = paragraphs[i].text.strip()
                                     if prev_text:
                                         prev_paras_text.append(prev_text)
                             
-                            for i in range(para_idx + 1, min(para_idx + 3, len(doc.paragraphs))):
-                                if i < len(doc.paragraphs):
-                                    next_text = doc.paragraphs[i].text.strip()
+                            for i in range(para_idx + 1, min(para_idx + 3, total_paragraphs)):
+                                if i < total_paragraphs:
+                                    next_text = paragraphs[i].text.strip()
                                     if next_text:
                                         next_paras_text.append(next_text)
                             
                             # 获取最近的章节标题
-                            nearest_section_title = ""
-                            for section_idx, section_title in reversed(section_titles):
-                                if section_idx <= para_idx:
-                                    nearest_section_title = section_title
-                                    break
+                            nearest_section_title = nearest_title_by_para[para_idx]
                             
                             # 计算相对位置
                             relative_position = para_idx / total_paragraphs if total_paragraphs > 0 else 0.0
                             
                             for run in paragraph.runs:
                                 # 检查run中是否有图片
-                                blips = run._element.xpath('.//a:blip')
+                                blips = _BLIP_XPATH(run._element)
                                 
                                 if blips:
                                     # 通过关系ID精确匹配图片
                                     for blip in blips:
-                                        embed_id = blip.get(qn('r:embed'))
-                                        link_id = blip.get(qn('r:link'))
+                                        embed_id = blip.get(_EMBED_QN)
+                                        link_id = blip.get(_LINK_QN)
                                         rel_id = embed_id or link_id
                                         
                                         if rel_id and rel_id in rel_id_to_image_file:
@@ -1521,30 +1684,28 @@ class WordDocumentService:
                                             img_file = rel_id_to_image_file[rel_id]
                                             
                                             # 检查图片文件是否存在
-                                            if img_file in zip_file.namelist():
+                                            if img_file in zip_names:
                                                 image_counter += 1
                                                 image_id = f"image_{image_counter}"
                                                 
                                                 # 获取文件扩展名
-                                                ext = os.path.splitext(img_file)[1] or '.png'
-                                                file_name = os.path.basename(img_file)
+                                                ext = rel_id_to_ext[rel_id]
+                                                file_name = rel_id_to_basename[rel_id]
                                                 
                                                 # 生成描述
                                                 description = WordDocumentService._generate_image_description(
                                                     para_text, prev_paras_text, next_paras_text, nearest_section_title
                                                 )
                                                 
-                                                # 保存图片文件
+                                                # 图片文件稍后并行保存，这里只记录任务
                                                 saved_image_path = os.path.join(image_dir, f"{image_id}{ext}")
-                                                with zip_file.open(img_file) as source, open(saved_image_path, 'wb') as target:
-                                                    shutil.copyfileobj(source, target)
+                                                extract_tasks.append((len(images), img_file, saved_image_path))
                                                 
-                                                # 获取文件大小和格式
-                                                file_size = os.path.getsize(saved_image_path) if os.path.exists(saved_image_path) else 0
-                                                file_format = ext[1:].upper() if ext else 'UNKNOWN'  # 去掉点号，转为大写
+                                                # 获取文件格式（文件大小在保存后回填）
+                                                file_format = _format_for_ext(ext)
                                                 
                                                 # 获取相对路径
-                                                relative_path = f"extracted_images/{document_id}/{image_id}{ext}" if document_id else f"extracted_images/temp/{image_id}{ext}"
+                                                relative_path = f"{image_dir_rel}/{image_id}{ext}"
                                                 
                                                 # 构建完整的图片数据
                                                 images.append({
@@ -1555,7 +1716,7 @@ class WordDocumentService:
                                                     "relative_path": relative_path,
                                                     "file_name": file_name,
                                                     "rel_id": rel_id,
-                                                    "file_size": file_size,  # 添加文件大小
+                                                    "file_size": 0,  # 添加文件大小
                                                     "file_format": file_format,  # 添加文件格式
                                                     "context": para_text[:300] if para_text else "",
                                                     "prev_context": " | ".join(prev_paras_text[:2])[:200] if prev_paras_text else "",
@@ -1568,16 +1729,27 @@ class WordDocumentService:
                                                 
                                                 match_stats["matched_by_rel_id"] += 1
                                                 match_stats["with_rel_id"] += 1
-                                                logger.info(f"✅ 图片 {image_id} 通过关系ID匹配到段落 {para_idx} (rel_id: {rel_id}, 文件: {file_name}, 章节: {nearest_section_title[:30]})")
+                                                logger.info("✅ 图片 %s 通过关系ID匹配到段落 %s (rel_id: %s, 文件: %s, 章节: %s)", image_id, para_idx, rel_id, file_name, nearest_section_title[:30])
                                                 
                                                 # 注意：不删除，允许同一图片文件多次出现
                                                 # 继续处理下一个blip（一个段落可能有多张图片）
                                             else:
-                                                logger.warning(f"⚠️ 图片文件不存在: {img_file} (rel_id: {rel_id})")
+                                                logger.warning("⚠️ 图片文件不存在: %s (rel_id: %s)", img_file, rel_id)
+                        
+                        # 并行解压并保存图片（zlib解压和文件写入期间会释放GIL）
+                        if extract_tasks:
+                            max_workers = min(8, os.cpu_count() or 1, len(extract_tasks))
+                            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                                file_sizes = list(executor.map(
+                                    lambda task: WordDocumentService._save_zip_member(zip_file, task[1], task[2]),
+                                    extract_tasks
+                                ))
+                            for (image_idx, _, _), file_size in zip(extract_tasks, file_sizes):
+                                images[image_idx]["file_size"] = file_size
                                 
                                 
                 except Exception as e:
-                    logger.warning(f"从zip文件提取图片失败: {e}", exc_info=True)
+                    logger.warning("从zip文件提取图片失败: %s", e, exc_info=True)
             
             # 注意：图片编号已经在zip_file块内按文档顺序分配完成
             # 所有图片（包括未匹配的）都已经在zip_file块内处理并分配了image_id
@@ -1587,20 +1759,17 @@ class WordDocumentService:
             match_stats["unmatched"] = sum(1 for img in images if img.get("position") == -1)
             
             # 输出匹配统计信息
-            logger.info(f"📊 图片匹配统计: 总数={match_stats['total_images']}, "
-                       f"有rel_id={match_stats['with_rel_id']}, "
-                       f"无rel_id={match_stats['without_rel_id']}, "
-                       f"关系ID匹配={match_stats['matched_by_rel_id']}, "
-                       f"drawing匹配={match_stats['matched_by_drawing']}, "
-                       f"未匹配={match_stats['unmatched']}")
+            logger.info("📊 图片匹配统计: 总数=%s, 有rel_id=%s, 无rel_id=%s, 关系ID匹配=%s, drawing匹配=%s, 未匹配=%s",
+                        match_stats['total_images'], match_stats['with_rel_id'], match_stats['without_rel_id'],
+                        match_stats['matched_by_rel_id'], match_stats['matched_by_drawing'], match_stats['unmatched'])
             
             # 将匹配统计信息添加到第一张图片的元数据中（用于后续分析）
             if images:
                 images[0]["_match_stats"] = match_stats
             
-            logger.info(f"从文档中提取到 {len(images)} 张图片，已保存到 {image_dir}")
+            logger.info("从文档中提取到 %s 张图片，已保存到 %s", len(images), image_dir)
         except Exception as e:
-            logger.warning(f"提取图片时出错: {e}", exc_info=True)
+            logger.warning("提取图片时出错: %s", e, exc_info=True)
         
         return images
     
@@ -1608,149 +1777,111 @@ class WordDocumentService:
     def _split_by_sections(structured_content: List[Dict], max_tokens: int = 8000) -> List[Dict]:
         """按章节分块"""
         sections = []
-        current_section = None
         
-        for item in structured_content:
-            if item["type"] == "heading":
+        # 每个条目的 token 数只估算一次；续章节标题的 token 数按标题缓存
+        estimate_tokens = WordDocumentService._estimate_tokens
+        token_counts = [estimate_tokens(item.get("text", "")) for item in structured_content]
+        title_tokens_cache = {}
+        
+        # 当前章节的状态保存在局部变量中，章节结束时一次性组装为字典
+        # 默认章节承接第一个一级标题之前的内容；没有内容时不会被输出
+        cur_title = "概述"
+        cur_level = 1
+        cur_parts = []
+        cur_tokens = 0
+        cur_images = []
+        cur_links = []
+        cur_tables = []
+        
+        def flush_section() -> None:
+            sections.append({
+                "section_id": f"section_{len(sections)}",
+                "title": cur_title,
+                "level": cur_level,
+                "content": "".join(cur_parts),
+                "token_count": cur_tokens,
+                "images": cur_images,
+                "links": cur_links,
+                "tables": cur_tables
+            })
+        
+        def start_continuation(title_separator: str) -> None:
+            # 保存当前章节，创建"（续）"子章节，内容以原章节标题开头
+            nonlocal cur_title, cur_parts, cur_tokens, cur_images, cur_links, cur_tables
+            flush_section()
+            cur_parts = [cur_title + title_separator]
+            cur_tokens = title_tokens_cache.setdefault(cur_title, estimate_tokens(cur_title))
+            cur_title = cur_title + "（续）"
+            cur_images = []
+            cur_links = []
+            cur_tables = []
+        
+        for idx, item in enumerate(structured_content):
+            if item["type"] == _T_HEADING:
                 level = item.get("level", 1)
                 if level == 1:
                     # 一级标题：创建新章节
-                    if current_section and current_section.get("token_count", 0) > 0:
-                        sections.append(current_section)
+                    if cur_tokens > 0:
+                        flush_section()
                     
-                    # 创建新章节
-                    current_section = {
-                        "section_id": f"section_{len(sections)}",
-                        "title": item["text"],
-                        "level": level,
-                        "content": "",  # 一级标题不重复添加到content中
-                        "token_count": 0,
-                        "images": [],
-                        "links": item.get("links", []),
-                        "tables": []
-                    }
+                    # 创建新章节（一级标题不重复添加到content中）
+                    cur_title = item["text"]
+                    cur_level = level
+                    cur_parts = []
+                    cur_tokens = 0
+                    cur_images = []
+                    cur_links = list(item.get("links", []))
+                    cur_tables = []
                 else:
                     # 子标题（level > 1）：保留在父章节中，使用Markdown格式
-                    if current_section is None:
-                        # 如果没有章节，创建默认章节
-                        current_section = {
-                            "section_id": "section_0",
-                            "title": "概述",
-                            "level": 1,
-                            "content": "",
-                            "token_count": 0,
-                            "images": [],
-                            "links": [],
-                            "tables": []
-                        }
-                    
-                    # 使用Markdown标题格式（##, ###, ####等）
-                    heading_markdown = "#" * (level + 1)  # level=2 -> ##, level=3 -> ###
-                    heading_text = item["text"]
-                    heading_content = f"{heading_markdown} {heading_text}\n\n"
+                    heading_markdown = WordDocumentService._heading_prefix(level + 1)  # level=2 -> ##, level=3 -> ###
+                    heading_content = f"{heading_markdown} {item['text']}\n\n"
                     
                     # 检查是否需要分割（超过最大 token 数）
-                    heading_tokens = WordDocumentService._estimate_tokens(heading_content)
-                    if current_section["token_count"] + heading_tokens > max_tokens:
-                        # 保存当前章节
-                        sections.append(current_section)
-                        
-                        # 创建新章节（子章节）
-                        current_section = {
-                            "section_id": f"section_{len(sections)}",
-                            "title": current_section["title"] + "（续）",
-                            "level": current_section["level"],
-                            "content": current_section["title"] + "\n\n",
-                            "token_count": WordDocumentService._estimate_tokens(current_section["title"]),
-                            "images": [],
-                            "links": [],
-                            "tables": []
-                        }
+                    heading_tokens = estimate_tokens(heading_content)
+                    if cur_tokens + heading_tokens > max_tokens:
+                        start_continuation("\n\n")
                     
                     # 添加子标题到内容中
-                    current_section["content"] += heading_content
-                    current_section["token_count"] += heading_tokens
+                    cur_parts.append(heading_content)
+                    cur_tokens += heading_tokens
                     
                     # 处理子标题的链接
                     if item.get("links"):
-                        current_section["links"].extend(item.get("links", []))
+                        cur_links.extend(item["links"])
+            elif item["type"] == _T_TABLE:
+                # 表格直接添加到当前章节
+                cur_tables.append(item["data"])
+                # 表格文本也添加到内容中
+                table_text = item.get("text", "")
+                if table_text:
+                    item_tokens = token_counts[idx]
+                    # 检查是否需要分割
+                    if cur_tokens + item_tokens > max_tokens:
+                        start_continuation("\n")
+                    cur_parts.append(table_text + "\n")
+                    cur_tokens += item_tokens
             else:
-                # 添加到当前章节
-                if current_section is None:
-                    # 如果没有章节，创建默认章节
-                    current_section = {
-                        "section_id": "section_0",
-                        "title": "概述",
-                        "level": 1,
-                        "content": "",
-                        "token_count": 0,
-                        "images": [],
-                        "links": [],
-                        "tables": []
-                    }
+                # 处理段落、图片等其他类型
+                item_text = item.get("text", "")
+                item_tokens = token_counts[idx]
                 
-                # 处理表格类型
-                if item["type"] == "table":
-                    # 表格直接添加到当前章节
-                    current_section["tables"].append(item["data"])
-                    # 表格文本也添加到内容中
-                    table_text = item.get("text", "")
-                    if table_text:
-                        item_tokens = WordDocumentService._estimate_tokens(table_text)
-                        # 检查是否需要分割
-                        if current_section["token_count"] + item_tokens > max_tokens:
-                            # 保存当前章节
-                            sections.append(current_section)
-                            
-                            # 创建新章节（子章节）
-                            current_section = {
-                                "section_id": f"section_{len(sections)}",
-                                "title": current_section["title"] + "（续）",
-                                "level": current_section["level"],
-                                "content": current_section["title"] + "\n",
-                                "token_count": WordDocumentService._estimate_tokens(current_section["title"]),
-                                "images": [],
-                                "links": [],
-                                "tables": []
-                            }
-                        current_section["content"] += table_text + "\n"
-                        current_section["token_count"] += item_tokens
-                else:
-                    # 处理段落、图片等其他类型
-                    item_text = item.get("text", "")
-                    item_tokens = WordDocumentService._estimate_tokens(item_text) if item_text else 0
-                    
-                    # 检查是否需要分割（超过最大 token 数）
-                    if item_tokens > 0 and current_section["token_count"] + item_tokens > max_tokens:
-                        # 保存当前章节
-                        sections.append(current_section)
-                        
-                        # 创建新章节（子章节）
-                        current_section = {
-                            "section_id": f"section_{len(sections)}",
-                            "title": current_section["title"] + "（续）",
-                            "level": current_section["level"],
-                            "content": current_section["title"] + "\n",  # 保留标题
-                            "token_count": WordDocumentService._estimate_tokens(current_section["title"]),
-                            "images": [],
-                            "links": [],
-                            "tables": []
-                        }
-                    
-                    # 添加内容（确保段落之间有适当的空行）
-                    if item_text:
-                        current_section["content"] += item_text + "\n\n"
-                        current_section["token_count"] += item_tokens
-                    
-                    # 处理图片
-                    if item.get("images"):
-                        if "images" not in current_section:
-                            current_section["images"] = []
-                        current_section["images"].extend(item["images"])
+                # 检查是否需要分割（超过最大 token 数）
+                if item_tokens > 0 and cur_tokens + item_tokens > max_tokens:
+                    start_continuation("\n")  # 保留标题
+                
+                # 添加内容（确保段落之间有适当的空行）
+                if item_text:
+                    cur_parts.append(item_text + "\n\n")
+                    cur_tokens += item_tokens
+                
+                # 处理图片
+                if item.get("images"):
+                    cur_images.extend(item["images"])
         
         # 添加最后一个章节
-        if current_section and current_section.get("token_count", 0) > 0:
-            sections.append(current_section)
+        if cur_tokens > 0:
+            flush_section()
         
         return sections
     
@@ -1797,47 +1928,56 @@ class WordDocumentService:
             # 按一级标题分块
             return WordDocumentService._split_by_heading_level(structured_content, 1, max_tokens)
     
+    @staticmethod
+    def _render_item(item: Dict) -> tuple:
+        """
+        一次遍历同时生成条目的 Markdown 内容和 token 数
+        
+        Returns:
+            (markdown_text, token_count)，token 数按条目原始文本估算
+        """
+        item_text = item.get("text", "")
+        item_type = item.get("type")
+        if item_type == _T_HEADING:
+            heading_markdown = WordDocumentService._heading_prefix(item.get("level", 1))
+            return f"{heading_markdown} {item_text}\n\n", _estimate_tokens_cached(item_text)
+        if item_type == _T_TABLE or item_text:
+            return item_text + "\n\n", _estimate_tokens_cached(item_text)
+        return "", 0
+    
     @staticmethod
     def _split_no_split(structured_content: List[Dict], max_tokens: int = 8000) -> List[Dict]:
         """不分块：整个文档作为一个块"""
-        content = ""
+        # 整个文档的内容可能很大，写入单个缓冲区，避免同时持有所有片段
+        buf = io.StringIO()
         total_tokens = 0
         images = []
         tables = []
         links = []
+        # 第一个一级标题作为块标题，在同一遍历中顺带确定
+        first_level1_title = None
         
-        for idx, item in enumerate(structured_content):
-            item_text = item.get("text", "")
-            if item["type"] == "heading":
-                level = item.get("level", 1)
-                heading_markdown = "#" * level
-                content += f"{heading_markdown} {item_text}\n\n"
-            elif item["type"] == "table":
-                content += item_text + "\n\n"
-                tables.append(item.get("data", []))
-            else:
-                if item_text:
-                    content += item_text + "\n\n"
+        render_item = WordDocumentService._render_item
+        for item in structured_content:
+            item_content, item_tokens = render_item(item)
+            buf.write(item_content)
+            total_tokens += item_tokens
             
+            item_type = item.get("type")
+            if item_type == _T_TABLE:
+                tables.append(item.get("data", []))
+            elif item_type == _T_HEADING and first_level1_title is None and item.get("level", 1) == 1:
+                first_level1_title = item.get("text", "全文档")
             if item.get("images"):
                 images.extend(item["images"])
             if item.get("links"):
                 links.extend(item["links"])
-            
-            total_tokens += WordDocumentService._estimate_tokens(item_text)
-        
-        # 确定标题
-        title = "全文档"
-        for item in structured_content:
-            if item["type"] == "heading" and item.get("level", 1) == 1:
-                title = item.get("text", "全文档")
-                break
         
         return [{
             "section_id": "chunk_1",
-            "title": title,
+            "title": "全文档" if first_level1_title is None else first_level1_title,
             "level": 1,
-            "content": content.strip(),
+            "content": buf.getvalue().strip(),
             "token_count": total_tokens,
             "start_index": 0,
             "end_index": len(structured_content),
@@ -1849,72 +1989,68 @@ class WordDocumentService:
     @staticmethod
     def _split_by_fixed_tokens(structured_content: List[Dict], max_tokens: int = 8000) -> List[Dict]:
         """按固定 token 数分块"""
-        sections = []
-        current_section = {
-            "section_id": "chunk_1",
-            "title": "段落 1",
-            "level": 1,
-            "content": "",
-            "token_count": 0,
-            "start_index": 0,
-            "end_index": 0,
-            "images": [],
-            "tables": [],
-            "links": []
-        }
+        total_items = len(structured_content)
+        if total_items == 0:
+            return []
+        
+        # 第一遍：渲染各条目并做数值预处理，token_prefix[k] 为前 k 个条目的 token 总数
+        render_item = WordDocumentService._render_item
+        rendered = [render_item(item) for item in structured_content]
+        item_tokens = np.fromiter(
+            (item_tokens for _, item_tokens in rendered),
+            dtype=np.int64,
+            count=total_items
+        )
+        token_prefix = np.zeros(total_items + 1, dtype=np.int64)
+        np.cumsum(item_tokens, out=token_prefix[1:])
+        
+        # 第二遍：用二分查找确定分块边界（加入后超出 max_tokens 的条目开始新块，
+        # 当前块为空时超限条目仍归入当前块）
+        boundaries = [0]
+        start = 0
+        while True:
+            base = token_prefix[start]
+            split_idx = int(np.searchsorted(token_prefix, base + max_tokens, side="right")) - 1
+            if split_idx < total_items and token_prefix[split_idx] == base:
+                split_idx += 1
+            if split_idx >= total_items:
+                break
+            boundaries.append(split_idx)
+            start = split_idx
+        boundaries.append(total_items)
         
-        for idx, item in enumerate(structured_content):
-            item_text = item.get("text", "")
-            item_tokens = WordDocumentService._estimate_tokens(item_text) if item_text else 0
-            
-            # 构建内容
-            item_content = ""
-            if item["type"] == "heading":
-                level = item.get("level", 1)
-                heading_markdown = "#" * level
-                item_content = f"{heading_markdown} {item_text}\n\n"
-            elif item["type"] == "table":
-                item_content = item_text + "\n\n"
-            else:
-                if item_text:
-                    item_content = item_text + "\n\n"
-            
-            # 检查是否需要分块
-            if current_section["token_count"] + item_tokens > max_tokens and current_section["token_count"] > 0:
-                # 保存当前块
-                current_section["end_index"] = idx
-                sections.append(current_section)
-                
-                # 创建新块
-                chunk_num = len(sections) + 1
-                current_section = {
-                    "section_id": f"chunk_{chunk_num}",
-                    "title": f"段落 {chunk_num}",
-                    "level": 1,
-                    "content": "",
-                    "token_count": 0,
-                    "start_index": idx,
-                    "end_index": 0,
-                    "images": [],
-                    "tables": [],
-                    "links": []
-                }
+        # 第三遍：按边界区间拼接各块内容
+        sections = []
+        for start, end in zip(boundaries, boundaries[1:]):
+            token_count = int(token_prefix[end] - token_prefix[start])
+            if token_count <= 0:
+                continue
             
-            # 添加内容
-            current_section["content"] += item_content
-            current_section["token_count"] += item_tokens
+            chunk_num = len(sections) + 1
+            content_parts = [item_content for item_content, _ in rendered[start:end]]
+            images = []
+            tables = []
+            links = []
+            for item in structured_content[start:end]:
+                if item["type"] == _T_TABLE:
+                    tables.append(item.get("data", []))
+                if item.get("images"):
+                    images.extend(item["images"])
+                if item.get("links"):
+                    links.extend(item["links"])
             
-            if item.get("images"):
-                current_section["images"].extend(item["images"])
-            if item.get("links"):
-                current_section["links"].extend(item["links"])
-            if item["type"] == "table":
-                current_section["tables"].append(item.get("data", []))
-        
-        # 添加最后一个块
-        if current_section["token_count"] > 0:
-            current_section["end_index"] = len(structured_content)
-            sections.append(current_section)
+            sections.append({
+                "section_id": f"chunk_{chunk_num}",
+                "title": f"段落 {chunk_num}",
+                "level": 1,
+                "content": "".join(content_parts),
+                "token_count": token_count,
+                "start_index": start,
+                "end_index": end,
+                "images": images,
+                "tables": tables,
+                "links": links
+            })
         
         return sections
     
@@ -1926,73 +2062,61 @@ class WordDocumentService:
     ) -> List[Dict]:
         """按指定标题级别分块"""
         sections = []
-        current_section = None
-        current_start_index = 0
+        render_item = WordDocumentService._render_item
+        
+        # 当前块的状态保存在局部变量中，块结束时一次性组装为字典
+        # 默认块承接第一个分割标题之前的内容；没有内容时不会被输出
+        cur_title = "概述"
+        cur_level = 1
+        cur_start = 0
+        cur_body_start = 0  # 分割标题本身只贡献链接，其后的条目贡献图片和链接
+        cur_heading_links = []
+        cur_parts = []
+        cur_tokens = 0
+        cur_tables = []
+        
+        def close_section(end_index: int) -> None:
+            # 块结束时一次性收集图片和链接，避免逐条目 extend
+            body = structured_content[cur_body_start:end_index]
+            sections.append({
+                "section_id": f"chunk_{len(sections) + 1}",
+                "title": cur_title,
+                "level": cur_level,
+                "content": "".join(cur_parts),
+                "token_count": cur_tokens,
+                "start_index": cur_start,
+                "end_index": end_index,
+                "images": [img for it in body for img in (it.get("images") or ())],
+                "tables": cur_tables,
+                "links": cur_heading_links + [link for it in body for link in (it.get("links") or ())]
+            })
         
         for idx, item in enumerate(structured_content):
-            if item["type"] == "heading" and item.get("level", 1) <= split_level:
+            if item["type"] == _T_HEADING and item.get("level", 1) <= split_level:
                 # 遇到分割标题，保存之前的块
-                if current_section and current_section.get("token_count", 0) > 0:
-                    current_section["end_index"] = idx
-                    sections.append(current_section)
+                if cur_tokens > 0:
+                    close_section(idx)
                 
                 # 创建新块
-                current_start_index = idx
-                current_section = {
-                    "section_id": f"chunk_{len(sections) + 1}",
-                    "title": item["text"],
-                    "level": item.get("level", 1),
-                    "content": "",
-                    "token_count": 0,
-                    "start_index": idx,
-                    "end_index": 0,
-                    "images": [],
-                    "tables": [],
-                    "links": item.get("links", [])
-                }
+                cur_title = item["text"]
+                cur_level = item.get("level", 1)
+                cur_start = idx
+                cur_body_start = idx + 1
+                cur_heading_links = item.get("links", [])
+                cur_parts = []
+                cur_tokens = 0
+                cur_tables = []
             else:
-                # 添加到当前块
-                if current_section is None:
-                    # 如果没有块，创建默认块
-                    current_section = {
-                        "section_id": "chunk_1",
-                        "title": "概述",
-                        "level": 1,
-                        "content": "",
-                        "token_count": 0,
-                        "start_index": 0,
-                        "end_index": 0,
-                        "images": [],
-                        "tables": [],
-                        "links": []
-                    }
-                
-                item_text = item.get("text", "")
-                item_tokens = WordDocumentService._estimate_tokens(item_text) if item_text else 0
-                
-                # 构建内容
-                if item["type"] == "heading":
-                    level = item.get("level", 1)
-                    heading_markdown = "#" * level
-                    current_section["content"] += f"{heading_markdown} {item_text}\n\n"
-                elif item["type"] == "table":
-                    current_section["content"] += item_text + "\n\n"
-                    current_section["tables"].append(item.get("data", []))
-                else:
-                    if item_text:
-                        current_section["content"] += item_text + "\n\n"
-                
-                current_section["token_count"] += item_tokens
-                
-                if item.get("images"):
-                    current_section["images"].extend(item["images"])
-                if item.get("links"):
-                    current_section["links"].extend(item["links"])
+                # 添加到当前块：构建内容并累计 token 数
+                item_content, item_tokens = render_item(item)
+                cur_parts.append(item_content)
+                cur_tokens += item_tokens
+                if item["type"] == _T_TABLE:
+                    cur_tables.append(item.get("data", []))
         
         # 添加最后一个块
-        if current_section and current_section.get("token_count", 0) > 0:
-            current_section["end_index"] = len(structured_content)
-            sections.append(current_section)
+        if cur_tokens > 0:
+            close_section(len(structured_content))
         
         return sections
     
@@ -2035,8 +2159,8 @@ class WordDocumentService:
     
     @staticmethod
     def _estimate_tokens(text: str) -> int:
-        """估算文本的 token 数（中文通常 1 token ≈ 2 字符）"""
-        return len(text) // 2
+        """估算文本的 token 数（按字符类别区分 ASCII 与中文等多字节字符）"""
+        return _estimate_tokens_cached(text)
     
     @staticmethod
     def _extract_base_name(document_name: str) -> str:
@@ -2049,22 +2173,7 @@ class WordDocumentService:
         Returns:
             基础标识，例如 "产业项目-项目里程碑管理-软件需求规格说明书-20230731"
         """
-        import re
-        
-        # 支持多种版本号格式
-        patterns = [
-            r'\s*-\s*V\d+$',           # " - V1"
-            r'\s*-\s*v\d+$',           # " - v1"
-            r'\s*版本\d+$',             # " 版本1"
-            r'\s*Version\s*\d+$',      # " Version 1"
-            r'\s*version\s*\d+$',      # " version 1"
-        ]
-        
-        base_name = document_name
-        for pattern in patterns:
-            base_name = re.sub(pattern, '', base_name, flags=re.IGNORECASE)
-        
-        return base_name.strip()
+        return _extract_base_name_cached(document_name)
     
     @staticmethod
     def _extract_version(document_name: str) -> tuple[str, int]:
@@ -2077,15 +2186,7 @@ class WordDocumentService:
         Returns:
             (version_string, version_number) 例如 ("V1", 1)
         """
-        import re
-        
-        version_match = re.search(r'V(\d+)', document_name, re.IGNORECASE)
-        if version_match:
-            version_num = int(version_match.group(1))
-            return f"V{version_num}", version_num
-        
-        # 如果找不到，返回默认值
-        return "V1", 1
+        return _extract_version_cached(document_name)
     
     @staticmethod
     def _sanitize_group_id(name: str) -> str:
@@ -2100,30 +2201,38 @@ class WordDocumentService:
         Returns:
             清理后的名称（只包含字母数字、破折号、下划线）
         """
-        import re
-        
-        # 将中文字符和其他特殊字符替换为下划线
-        # 只保留字母数字、破折号、下划线
-        sanitized = re.sub(r'[^a-zA-Z0-9\-_]', '_', name)
-        
-        # 将连续的下划线替换为单个下划线
-        sanitized = re.sub(r'_+', '_', sanitized)
-        
-        # 去除开头和结尾的下划线
-        sanitized = sanitized.strip('_')
+        return _sanitize_group_id_cached(name)
+    
+    @staticmethod
+    def _build_section_index(structured_content: List[Dict]) -> Dict[str, Any]:
+        """
+        构建一级标题索引（一次遍历structured_content）
         
-        # 如果清理后为空，使用默认值
-        if not sanitized:
-            sanitized = "document"
+        按章节循环调用_build_section_content时，调用方构建一次后通过section_index参数传入，
+        避免每个章节都重新遍历整个文档
         
-        # 限制长度（避免过长）
-        if len(sanitized) > 50:
-            sanitized = sanitized[:50]
+        Returns:
+            {
+                "title_to_index": {标题文本: 首次出现的位置},
+                "level1_indices": 所有一级标题位置（升序 numpy 数组），
+                "has_level1_heading": bool
+            }
+        """
+        title_to_index = {}
+        level1_positions = []
+        for idx, item in enumerate(structured_content):
+            if item.get("type") == "heading" and item.get("level", 1) == 1:
+                title_to_index.setdefault(item.get("text"), idx)
+                level1_positions.append(idx)
         
-        return sanitized
+        return {
+            "title_to_index": title_to_index,
+            "level1_indices": np.array(level1_positions, dtype=np.int64),
+            "has_level1_heading": bool(title_to_index)
+        }
     
     @staticmethod
-    def _build_section_content(section: Dict, doc_data: Dict, section_idx: int, document_id: str = None, upload_id: int = None) -> str:
+    def _build_section_content(section: Dict, doc_data: Dict, section_idx: int, document_id: str = None, upload_id: int = None, section_index: Dict[str, Any] = None, table_markdown_cache: Optional[Dict[str, str]] = None) -> str:
         """
         构建章节内容（1:1对应原始文档，不添加额外描述）
         
@@ -2141,25 +2250,27 @@ class WordDocumentService:
         if document_id and 'document_id' not in doc_data:
             doc_data['document_id'] = document_id
         
+        # 只查找一次 structured_content 及其长度
+        structured_content = doc_data.get("structured_content") or []
+        sc_len = len(structured_content)
+        
         # 找到当前章节在structured_content中的范围
         section_start_idx = None
         section_end_idx = None
         section_title_found = False  # 标记是否在原始文档中找到该章节标题
+        if section_index is None:
+            section_index = WordDocumentService._build_section_index(structured_content)
         
         # 找到当前章节的起始位置（一级标题）
-        for idx, item in enumerate(doc_data.get("structured_content", [])):
-            if item.get("type") == "heading" and item.get("level", 1) == 1:
-                # 如果找到了匹配的标题，记录起始位置
-                if item.get("text") == section.get("title"):
-                    section_start_idx = idx
-                    section_title_found = True
-                    # 找到下一个一级标题作为结束位置
-                    for next_idx in range(idx + 1, len(doc_data.get("structured_content", []))):
-                        next_item = doc_data["structured_content"][next_idx]
-                        if next_item.get("type") == "heading" and next_item.get("level", 1) == 1:
-                            section_end_idx = next_idx
-                            break
-                    break
+        idx = section_index["title_to_index"].get(section.get("title"))
+        if idx is not None:
+            section_start_idx = idx
+            section_title_found = True
+            # 二分查找下一个一级标题作为结束位置
+            level1_indices = section_index["level1_indices"]
+            pos = int(np.searchsorted(level1_indices, idx, side="right"))
+            if pos < len(level1_indices):
+                section_end_idx = int(level1_indices[pos])
         
         # 如果没有找到匹配的标题（可能是系统生成的"概述"），不输出任何内容
         # 这样可以避免重复输出整个文档
@@ -2168,14 +2279,10 @@ class WordDocumentService:
             # 但只输出一次（第一个章节）
             if section.get("title") == "概述" and section_idx == 0:
                 # 检查原始文档是否真的没有一级标题
-                has_level1_heading = any(
-                    item.get("type") == "heading" and item.get("level", 1) == 1
-                    for item in doc_data.get("structured_content", [])
-                )
-                if not has_level1_heading:
+                if not section_index["has_level1_heading"]:
                     # 原始文档确实没有一级标题，输出整个文档
                     section_start_idx = 0
-                    section_end_idx = len(doc_data.get("structured_content", []))
+                    section_end_idx = sc_len
                 else:
                     # 原始文档有一级标题，但当前章节标题不匹配，不输出
                     return ""
@@ -2189,117 +2296,102 @@ class WordDocumentService:
         
         # 如果没有找到结束位置，使用文档末尾
         if section_end_idx is None:
-            section_end_idx = len(doc_data.get("structured_content", []))
+            section_end_idx = sc_len
         
         # 构建章节内容（按照structured_content的顺序）
         # 只有当原始文档中存在该章节标题时，才输出标题
         # 注意：标题文本应该包含原始文档中的完整文本（包括数字前缀，如"1 项目里程碑管理"）
-        content = ""
+        parts = []
         if section_title_found:
             # 从原始文档中获取完整的标题文本（包含数字前缀）
-            original_title_text = ""
-            for idx, item in enumerate(doc_data.get("structured_content", [])):
-                if idx == section_start_idx and item.get("type") == "heading":
-                    original_title_text = item.get("text", section.get("title", ""))
-                    break
+            original_title_text = structured_content[section_start_idx].get("text", section.get("title", ""))
             # 如果找到了原始标题文本，使用它；否则使用section中的title
             title_to_use = original_title_text if original_title_text else section.get("title", "")
-            content = f"# {title_to_use}\n\n"
+            parts.append(f"# {title_to_use}\n\n")
+        
+        # 循环不变量：文档ID及图片、嵌入文档的URL前缀
+        doc_id = doc_data.get('document_id')
+        # 图片Markdown的固定前缀（空alt text + 图片URL前缀），循环内只做拼接
+        image_md_prefix = f"![](/api/word-document/{doc_id}/images/" if doc_id else None
+        # 如果upload_id存在，使用document-upload API；否则使用word-document API（兼容旧格式）
+        if upload_id:
+            ole_url_prefix = f"/api/document-upload/{upload_id}/ole/"
+        elif doc_id:
+            ole_url_prefix = f"/api/word-document/{doc_id}/ole/"
+        else:
+            ole_url_prefix = None
+        
+        def append_images(item):
+            # 只保留图片链接，不添加额外描述
+            # 注意：当前代码中没有提取原始图注的逻辑，暂时使用空alt text
+            images = item.get("images")
+            if not image_md_prefix or not images:
+                return
+            if len(images) == 1:
+                # 常见情况：段落只有一张图片
+                image = images[0]
+                if image.get('relative_path'):
+                    parts.append(image_md_prefix + image.get('image_id', '') + ")\n\n")
+                return
+            for image in images:
+                if image.get('relative_path'):
+                    parts.append(image_md_prefix + image.get('image_id', '') + ")\n\n")
+        
+        def handle_heading(item):
+            # 处理子标题（level > 1）
+            level = item.get("level", 2)
+            heading_markdown = WordDocumentService._heading_prefix(level + 1)  # level=2 -> ##, level=3 -> ###
+            parts.append(f"{heading_markdown} {item.get('text', '')}\n\n")
+        
+        def handle_paragraph(item):
+            paragraph_text = item.get("text", "")
+            if paragraph_text:
+                parts.append(f"{paragraph_text}\n\n")
+            # 如果段落有关联的图片，立即插入（保留原始位置）
+            append_images(item)
+        
+        def handle_table(item):
+            # 不添加系统生成的标题，只保留表格内容（使用标准Markdown表格格式）
+            parts.append(WordDocumentService._get_table_markdown(item.get("data", {}), table_markdown_cache) + "\n\n")
+        
+        handlers = {
+            "heading": handle_heading,
+            "paragraph": handle_paragraph,
+            "table": handle_table,
+            "image_only": append_images,  # 单独的图片
+        }
         
         # 按照structured_content的顺序构建内容
-        for idx in range(section_start_idx, min(section_end_idx, len(doc_data.get("structured_content", [])))):
-            if idx >= len(doc_data.get("structured_content", [])):
-                break
-            item = doc_data["structured_content"][idx]
+        for item in structured_content[section_start_idx:section_end_idx]:
+            item_type = item.get("type")
             
             # 跳过一级标题（已经在上面添加了）
-            if item.get("type") == "heading" and item.get("level", 1) == 1:
+            if item_type == "heading" and item.get("level", 1) == 1:
                 continue
             
-            # 处理子标题（level > 1）
-            if item.get("type") == "heading" and item.get("level", 1) > 1:
-                level = item.get("level", 2)
-                heading_markdown = "#" * (level + 1)  # level=2 -> ##, level=3 -> ###
-                heading_text = item.get("text", "")
-                content += f"{heading_markdown} {heading_text}\n\n"
-            
-            # 处理段落
-            elif item.get("type") == "paragraph":
-                paragraph_text = item.get("text", "")
-                if paragraph_text:
-                    content += f"{paragraph_text}\n\n"
-                
-                # 如果段落有关联的图片，立即插入（保留原始位置）
-                # 只保留图片链接，不添加额外描述
-                if item.get("images"):
-                    for image in item["images"]:
-                        image_id = image.get('image_id', '')
-                        relative_path = image.get('relative_path', '')
-                        
-                        # 尝试获取原始图注（如果有），否则使用空alt text
-                        # 注意：当前代码中没有提取原始图注的逻辑，暂时使用空alt text
-                        alt_text = ""  # 可以后续扩展提取原始图注的逻辑
-                        
-                        if relative_path and doc_data.get('document_id'):
-                            document_id = doc_data.get('document_id')
-                            image_url = f"/api/word-document/{document_id}/images/{image_id}"
-                            content += f"![{alt_text}]({image_url})\n\n"
-            
-            # 处理表格（保留原始位置）
-            # 不添加系统生成的标题，只保留表格内容
-            elif item.get("type") == "table":
-                table_data = item.get("data", {})
-                
-                # 注意：当前代码中没有提取原始表格标题的逻辑
-                # 如果后续需要支持原始表格标题，需要在这里添加提取逻辑
-                # 暂时只保留表格内容，不添加任何标题
-                
-                # 使用标准Markdown表格格式
-                content += WordDocumentService._format_table_as_markdown(table_data) + "\n\n"
-            
-            # 处理image_only类型（单独的图片）
-            elif item.get("type") == "image_only":
-                if item.get("images"):
-                    for image in item["images"]:
-                        image_id = image.get('image_id', '')
-                        relative_path = image.get('relative_path', '')
-                        
-                        # 只保留图片链接，不添加额外描述
-                        alt_text = ""  # 可以后续扩展提取原始图注的逻辑
-                        
-                        if relative_path and doc_data.get('document_id'):
-                            document_id = doc_data.get('document_id')
-                            image_url = f"/api/word-document/{document_id}/images/{image_id}"
-                            content += f"![{alt_text}]({image_url})\n\n"
+            handler = handlers.get(item_type)
+            if handler is not None:
+                handler(item)
             
             # 处理OLE对象（嵌入文档）
             # 生成包含完整信息的Markdown格式，与"需求管理"的显示方式一致
             if item.get("ole_objects"):
-                for ole in item.get("ole_objects", []):
+                for ole in item["ole_objects"]:
                     ole_id = ole.get('ole_id', '')
-                    ole_name = ole.get('name', '嵌入文档')
-                    ole_type = ole.get('type', '嵌入对象')
-                    document_id = doc_data.get('document_id', '')
-                    
-                    # 如果upload_id存在，使用document-upload API；否则使用word-document API
-                    if upload_id and ole_id:
-                        preview_url = f"/api/document-upload/{upload_id}/ole/{ole_id}?view=preview"
-                        download_url = f"/api/document-upload/{upload_id}/ole/{ole_id}?view=download"
+                    if ole_id and ole_url_prefix:
+                        ole_name = ole.get('name', '嵌入文档')
+                        ole_type = ole.get('type', '嵌入对象')
+                        preview_url = f"{ole_url_prefix}{ole_id}?view=preview"
+                        download_url = f"{ole_url_prefix}{ole_id}?view=download"
                         # 生成包含文件名、类型、查看/下载链接的Markdown
-                        content += f"[嵌入文档: {ole_name} ({ole_type})]({preview_url})\n"
-                        content += f"[查看]({preview_url}) | [下载]({download_url})\n\n"
-                    elif document_id and ole_id:
-                        # 兼容旧格式（使用word-document API）
-                        preview_url = f"/api/word-document/{document_id}/ole/{ole_id}?view=preview"
-                        download_url = f"/api/word-document/{document_id}/ole/{ole_id}?view=download"
-                        content += f"[嵌入文档: {ole_name} ({ole_type})]({preview_url})\n"
-                        content += f"[查看]({preview_url}) | [下载]({download_url})\n\n"
+                        parts.append(f"[嵌入文档: {ole_name} ({ole_type})]({preview_url})\n")
+                        parts.append(f"[查看]({preview_url}) | [下载]({download_url})\n\n")
                     else:
-                        content += "[嵌入文档]\n\n"
+                        parts.append("[嵌入文档]\n\n")
         
         # 注意：不再添加章节末尾的链接列表，链接保留在原始位置（段落中）
         
-        return content
+        return "".join(parts)
     
     @staticmethod
     def _build_content_from_items(items: List[Dict], doc_data: Dict, document_id: str = None, upload_id: int = None) -> str:
@@ -2315,85 +2407,93 @@ class WordDocumentService:
         """
         if document_id and 'document_id' not in doc_data:
             doc_data['document_id'] = document_id
-        
-        content = ""
+        doc_id = doc_data.get('document_id')
+        
+        parts = []
+        
+        # 图片Markdown的固定前缀（alt text暂为空，可以后续扩展提取原始图注的逻辑）
+        image_md_prefix = f"![](/api/word-document/{doc_id}/images/" if doc_id else None
+        
+        def append_images(images):
+            if len(images) == 1:
+                # 常见情况：只有一张图片
+                image = images[0]
+                if image.get('relative_path'):
+                    parts.append(image_md_prefix + image.get('image_id', '') + ")\n\n")
+                return
+            for image in images:
+                if image.get('relative_path'):
+                    parts.append(image_md_prefix + image.get('image_id', '') + ")\n\n")
+        
+        def handle_paragraph(item):
+            paragraph_text = item.get("text", "")
+            if paragraph_text:
+                parts.append(f"{paragraph_text}\n\n")
+            
+            # 如果段落有关联的图片，立即插入（保留原始位置）
+            if image_md_prefix and item.get("images"):
+                append_images(item["images"])
+        
+        def handle_heading(item):
+            # 可能是封面页的标题，不是一级标题
+            heading_text = item.get("text", "")
+            if heading_text:
+                # 使用对应的Markdown标题级别
+                heading_markdown = WordDocumentService._heading_prefix(item.get("level", 1) + 1)  # level=1 -> ##, level=2 -> ###
+                parts.append(f"{heading_markdown} {heading_text}\n\n")
+        
+        def handle_table(item):
+            table_data = item.get("data", {})
+            # 如果原始Word文档有表格标题，则保留
+            if table_data.get("caption"):
+                parts.append(f"### {table_data['caption']}\n\n")
+            # 使用标准Markdown表格格式
+            parts.append(WordDocumentService._format_table_as_markdown(table_data) + "\n\n")
+        
+        def handle_image_only(item):
+            # 单独的图片
+            if image_md_prefix and item.get("images"):
+                append_images(item["images"])
+        
+        handlers = {
+            "paragraph": handle_paragraph,
+            "heading": handle_heading,
+            "table": handle_table,  # 保留原始位置
+            "image_only": handle_image_only,
+        }
         
         for item in items:
-            # 处理段落
-            if item.get("type") == "paragraph":
-                paragraph_text = item.get("text", "")
-                if paragraph_text:
-                    content += f"{paragraph_text}\n\n"
-                
-                # 如果段落有关联的图片，立即插入（保留原始位置）
-                if item.get("images"):
-                    for image in item["images"]:
-                        image_id = image.get('image_id', '')
-                        relative_path = image.get('relative_path', '')
-                        alt_text = ""  # 可以后续扩展提取原始图注的逻辑
-                        
-                        if relative_path and doc_data.get('document_id'):
-                            document_id = doc_data.get('document_id')
-                            image_url = f"/api/word-document/{document_id}/images/{image_id}"
-                            content += f"![{alt_text}]({image_url})\n\n"
-            
-            # 处理标题（可能是封面页的标题，不是一级标题）
-            elif item.get("type") == "heading":
-                level = item.get("level", 1)
-                heading_text = item.get("text", "")
-                if heading_text:
-                    # 使用对应的Markdown标题级别
-                    heading_markdown = "#" * (level + 1)  # level=1 -> ##, level=2 -> ###
-                    content += f"{heading_markdown} {heading_text}\n\n"
-            
-            # 处理表格（保留原始位置）
-            elif item.get("type") == "table":
-                table_data = item.get("data", {})
-                # 如果原始Word文档有表格标题，则保留
-                if table_data.get("caption"):
-                    content += f"### {table_data['caption']}\n\n"
-                # 使用标准Markdown表格格式
-                content += WordDocumentService._format_table_as_markdown(table_data) + "\n\n"
-            
-            # 处理image_only类型（单独的图片）
-            elif item.get("type") == "image_only":
-                if item.get("images"):
-                    for image in item["images"]:
-                        image_id = image.get('image_id', '')
-                        relative_path = image.get('relative_path', '')
-                        alt_text = ""
-                        
-                        if relative_path and doc_data.get('document_id'):
-                            document_id = doc_data.get('document_id')
-                            image_url = f"/api/word-document/{document_id}/images/{image_id}"
-                            content += f"![{alt_text}]({image_url})\n\n"
+            get = item.get
+            handler = handlers.get(get("type"))
+            if handler:
+                handler(item)
             
             # 处理OLE对象（嵌入文档）
             # 生成包含完整信息的Markdown格式，与"需求管理"的显示方式一致
-            if item.get("ole_objects"):
-                for ole in item.get("ole_objects", []):
+            ole_objects = get("ole_objects")
+            if ole_objects:
+                for ole in ole_objects:
                     ole_id = ole.get('ole_id', '')
                     ole_name = ole.get('name', '嵌入文档')
                     ole_type = ole.get('type', '嵌入对象')
-                    document_id = doc_data.get('document_id', '')
                     
                     # 如果upload_id存在，使用document-upload API；否则使用word-document API
                     if upload_id and ole_id:
                         preview_url = f"/api/document-upload/{upload_id}/ole/{ole_id}?view=preview"
                         download_url = f"/api/document-upload/{upload_id}/ole/{ole_id}?view=download"
                         # 生成包含文件名、类型、查看/下载链接的Markdown
-                        content += f"[嵌入文档: {ole_name} ({ole_type})]({preview_url})\n"
-                        content += f"[查看]({preview_url}) | [下载]({download_url})\n\n"
-                    elif document_id and ole_id:
+                        parts.append(f"[嵌入文档: {ole_name} ({ole_type})]({preview_url})\n")
+                        parts.append(f"[查看]({preview_url}) | [下载]({download_url})\n\n")
+                    elif doc_id and ole_id:
                         # 兼容旧格式（使用word-document API）
-                        preview_url = f"/api/word-document/{document_id}/ole/{ole_id}?view=preview"
-                        download_url = f"/api/word-document/{document_id}/ole/{ole_id}?view=download"
-                        content += f"[嵌入文档: {ole_name} ({ole_type})]({preview_url})\n"
-                        content += f"[查看]({preview_url}) | [下载]({download_url})\n\n"
+                        preview_url = f"/api/word-document/{doc_id}/ole/{ole_id}?view=preview"
+                        download_url = f"/api/word-document/{doc_id}/ole/{ole_id}?view=download"
+                        parts.append(f"[嵌入文档: {ole_name} ({ole_type})]({preview_url})\n")
+                        parts.append(f"[查看]({preview_url}) | [下载]({download_url})\n\n")
                     else:
-                        content += "[嵌入文档]\n\n"
+                        parts.append("[嵌入文档]\n\n")
         
-        return content.strip()
+        return "".join(parts).strip()
     
     @staticmethod
     def _extract_author_from_content(doc_data: Dict) -> Optional[str]:
@@ -2408,9 +2508,13 @@ class WordDocumentService:
         Returns:
             作者信息（如果找到），否则返回None
         """
-        # 查找"文档修改记录"表格
-        # 表格标题可能包含：文档修改记录、修改记录、修订记录等
-        modification_record_keywords = ["文档修改记录", "修改记录", "修订记录", "版本记录"]
+        # 一次遍历建立 table_id -> 在structured_content中的位置（取首次出现）
+        structured_content = doc_data.get("structured_content", [])
+        table_index = {}
+        for item_idx, item in enumerate(structured_content):
+            get = item.get
+            if get("type") == "table":
+                table_index.setdefault(get("table_id"), item_idx)
         
         for table_data in doc_data.get("tables", []):
             headers = table_data.get("headers", [])
@@ -2425,7 +2529,7 @@ class WordDocumentService:
             for idx, header in enumerate(headers):
                 if "作者" in header:
                     author_col_idx = idx
-                break
+                    break
             
             if author_col_idx is None:
                 continue
@@ -2433,38 +2537,33 @@ class WordDocumentService:
             # 检查表格前的标题是否是"文档修改记录"相关
             # 查找表格在structured_content中的位置
             table_id = table_data.get("table_id", "")
-            for item in doc_data.get("structured_content", []):
-                if item.get("type") == "table" and item.get("table_id") == table_id:
-                    # 查找表格前的标题
-                    item_idx = doc_data.get("structured_content", []).index(item)
-                    # 向前查找最近的标题
-                    for prev_idx in range(item_idx - 1, max(-1, item_idx - 10), -1):
-                        prev_item = doc_data.get("structured_content", [])[prev_idx]
-                        if prev_item.get("type") == "heading" or prev_item.get("type") == "paragraph":
-                            prev_text = prev_item.get("text", "")
-                            # 检查是否包含修改记录相关的关键词
-                            if any(keyword in prev_text for keyword in modification_record_keywords):
-                                # 找到了"文档修改记录"表格，提取作者信息
-                                # 从第一行数据中提取作者（通常是最新的版本）
-                                if rows and len(rows) > 0:
-                                    author = rows[0][author_col_idx].strip() if author_col_idx < len(rows[0]) else ""
-                                    if author:
-                                        # 去重：如果多行作者相同，只返回一个
-                                        unique_authors = set()
-                                        for row in rows:
-                                            if author_col_idx < len(row):
-                                                author_name = row[author_col_idx].strip()
-                                                if author_name:
-                                                    unique_authors.add(author_name)
-                                        
-                                        # 如果所有作者都相同，返回一个；否则返回所有作者（用顿号分隔）
-                                        if len(unique_authors) == 1:
-                                            return list(unique_authors)[0]
-                                        elif len(unique_authors) > 1:
-                                            return "、".join(sorted(unique_authors))
-                                        else:
-                                            return author
-                                break
+            item_idx = table_index.get(table_id)
+            if item_idx is None:
+                continue
+            
+            # 向前查找最近的标题
+            for prev_idx in range(item_idx - 1, max(-1, item_idx - 10), -1):
+                prev_item = structured_content[prev_idx]
+                if prev_item.get("type") in ("heading", "paragraph"):
+                    prev_text = prev_item.get("text", "")
+                    # 检查是否包含修改记录相关的关键词
+                    if _MODIFICATION_RE.search(prev_text):
+                        # 找到了"文档修改记录"表格，提取作者信息
+                        # 从第一行数据中提取作者（通常是最新的版本）
+                        if rows and len(rows) > 0:
+                            author = rows[0][author_col_idx].strip() if author_col_idx < len(rows[0]) else ""
+                            if author:
+                                # 去重（保持在表格中的出现顺序）：如果多行作者相同，只返回一个
+                                unique_authors = dict.fromkeys(
+                                    author_name
+                                    for row in rows
+                                    if author_col_idx < len(row) and (author_name := row[author_col_idx].strip())
+                                )
+                                
+                                # 如果所有作者都相同，返回一个；否则返回所有作者（用顿号分隔）
+                                if len(unique_authors) == 1:
+                                    return next(iter(unique_authors))
+                                return "、".join(unique_authors)
                     break
         
         # 如果没有找到，返回None（不显示作者）
@@ -2483,17 +2582,15 @@ class WordDocumentService:
         Returns:
             功能概述内容（如果找到），否则返回None
         """
-        # 概述相关的关键词
-        overview_keywords = ["概述", "功能说明", "功能描述", "系统说明", "项目说明", "简介", "背景"]
-        
         # 查找包含概述关键词的章节
         for idx, item in enumerate(structured_content):
             if item.get("type") == "heading":
                 heading_text = item.get("text", "").strip()
                 # 检查标题是否包含概述关键词
-                if any(keyword in heading_text for keyword in overview_keywords):
+                if _OVERVIEW_RE.search(heading_text):
                     # 找到概述章节，收集该章节的内容
                     content_parts = []
+                    running_len = -2  # 按"\n\n"拼接后的长度
                     current_level = item.get("level", 1)
                     
                     # 从下一个元素开始收集内容，直到遇到同级或更高级别的标题
@@ -2510,6 +2607,10 @@ class WordDocumentService:
                             text = next_item.get("text", "").strip()
                             if text:
                                 content_parts.append(text)
+                                running_len += len(text) + 2
+                                # 已超过截断长度，后续内容不会出现在结果中
+                                if running_len > 500:
+                                    break
                     
                     # 返回收集的内容（限制长度）
                     if content_parts:
@@ -2553,74 +2654,78 @@ class WordDocumentService:
                 except ValueError:
                     upload_id = None
         
-        summary = "# 文档解析总结\n\n"
+        # 逐段写入缓冲区，最后一次性取出
+        buf = io.StringIO()
+        w = buf.write
+        w("# 文档解析总结\n\n")
         
         # 文档基本信息
         metadata = doc_data.get("metadata", {})
         structured_content = doc_data.get("structured_content", [])
+        images = doc_data.get("images", [])
+        tables = doc_data.get("tables", [])
+        links = doc_data.get("links", [])
+        ole_objects = doc_data.get("ole_objects", [])
         
         # 尝试从文档内容中提取作者信息（优先从"文档修改记录"表格中提取）
         author_from_content = WordDocumentService._extract_author_from_content(doc_data)
         
-        summary += "## 文档概览\n\n"
+        w("## 文档概览\n\n")
         
         # 基本信息
-        summary += "### 基本信息\n\n"
+        w("### 基本信息\n\n")
         # 使用文件名作为文档标题（去掉扩展名）
         if file_name:
             # 去掉文件扩展名
             doc_title = file_name.rsplit('.', 1)[0] if '.' in file_name else file_name
         else:
             doc_title = metadata.get('title', '未命名文档')
-        summary += f"- **文档标题**: {doc_title}\n"
+        w(f"- **文档标题**: {doc_title}\n")
         if author_from_content:
-            summary += f"- **作者**: {author_from_content}\n"
-        if metadata.get('created'):
-            created = metadata.get('created')
+            w(f"- **作者**: {author_from_content}\n")
+        created = metadata.get('created')
+        if created:
             if isinstance(created, datetime):
-                summary += f"- **创建时间**: {created.strftime('%Y-%m-%d %H:%M:%S')}\n"
+                w(f"- **创建时间**: {created.strftime('%Y-%m-%d %H:%M:%S')}\n")
             else:
-                summary += f"- **创建时间**: {created}\n"
-        if metadata.get('modified'):
-            modified = metadata.get('modified')
+                w(f"- **创建时间**: {created}\n")
+        modified = metadata.get('modified')
+        if modified:
             if isinstance(modified, datetime):
-                summary += f"- **修改时间**: {modified.strftime('%Y-%m-%d %H:%M:%S')}\n"
+                w(f"- **修改时间**: {modified.strftime('%Y-%m-%d %H:%M:%S')}\n")
             else:
-                summary += f"- **修改时间**: {modified}\n"
-        summary += "\n"
+                w(f"- **修改时间**: {modified}\n")
+        w("\n")
         
         # 章节结构（带层级的目录）
-        summary += "### 章节结构\n\n"
-        summary += "本文档包含以下主要章节：\n\n"
-        for item in structured_content:
-            if item.get("type") == "heading":
-                level = item.get("level", 1)
-                heading_text = item.get("text", "").strip()
-                if heading_text:
-                    indent = "  " * (level - 1)
-                    summary += f"{indent}- {heading_text}\n"
-        summary += "\n"
+        w("### 章节结构\n\n")
+        w("本文档包含以下主要章节：\n\n")
+        toc_lines = [
+            f"{'  ' * (item.get('level', 1) - 1)}- {heading_text}"
+            for item in structured_content
+            if item.get("type") == "heading" and (heading_text := item.get("text", "").strip())
+        ]
+        w("\n".join(toc_lines) + "\n\n" if toc_lines else "\n")
         
         # 功能概述（查找第一个"概述"相关章节的内容）
         overview_content = WordDocumentService._extract_overview_content(structured_content)
         if overview_content:
-            summary += "### 功能概述\n\n"
-            summary += overview_content + "\n\n"
+            w("### 功能概述\n\n")
+            w(overview_content + "\n\n")
         
         # 统计信息
-        summary += "## 统计信息\n\n"
-        summary += f"- **章节数**: {len(sections)}\n"
-        summary += f"- **图片数**: {len(doc_data.get('images', []))}\n"
-        summary += f"- **表格数**: {len(doc_data.get('tables', []))}\n"
-        summary += f"- **链接数**: {len(doc_data.get('links', []))}\n"
-        summary += f"- **嵌入文档数**: {len(doc_data.get('ole_objects', []))}\n"
-        summary += f"- **文本长度**: {len(doc_data.get('text_content', ''))} 字符\n"
-        summary += "\n"
-        
-        # 图片清单
-        images = doc_data.get("images", [])
+        w("## 统计信息\n\n")
+        w(f"- **章节数**: {len(sections)}\n")
+        w(f"- **图片数**: {len(images)}\n")
+        w(f"- **表格数**: {len(tables)}\n")
+        w(f"- **链接数**: {len(links)}\n")
+        w(f"- **嵌入文档数**: {len(ole_objects)}\n")
+        w(f"- **文本长度**: {len(doc_data.get('text_content', ''))} 字符\n")
+        w("\n")
+        
+        # 图片清单（每张图片的内容先在局部列表中拼好，再整体追加）
         if images:
-            summary += "## 图片清单\n\n"
+            w("## 图片清单\n\n")
             for idx, image in enumerate(images, 1):
                 image_id = image.get("image_id", f"image_{idx}")
                 image_desc = image.get("description", "图片")
@@ -2630,107 +2735,111 @@ class WordDocumentService:
                 next_context = image.get("next_context", "")
                 image_context = image.get("context", "")
                 
-                summary += f"### 图片 {idx} ({image_id})\n\n"
-                summary += f"- **描述**: {image_desc}\n"
-                summary += f"- **位置**: {section_title} (文档位置: {relative_position:.1%})\n"
+                block = [
+                    f"### 图片 {idx} ({image_id})\n\n",
+                    f"- **描述**: {image_desc}\n",
+                    f"- **位置**: {section_title} (文档位置: {relative_position:.1%})\n"
+                ]
                 
                 if upload_id:
                     image_url = f"/api/document-upload/{upload_id}/images/{image_id}"
-                    summary += f"- **链接**: [查看图片]({image_url})\n"
+                    block.append(f"- **链接**: [查看图片]({image_url})\n")
                 
                 # 添加上下文信息
-                summary += "\n**上下文信息**:\n"
+                block.append("\n**上下文信息**:\n")
                 if prev_context:
-                    summary += f"- **前文**: {prev_context}\n"
+                    block.append(f"- **前文**: {prev_context}\n")
                 if image_context:
-                    summary += f"- **当前段落**: {image_context}\n"
+                    block.append(f"- **当前段落**: {image_context}\n")
                 if next_context:
-                    summary += f"- **后文**: {next_context}\n"
+                    block.append(f"- **后文**: {next_context}\n")
                 if not prev_context and not image_context and not next_context:
-                    summary += "- 无上下文信息\n"
+                    block.append("- 无上下文信息\n")
                 
-                summary += "\n"
+                block.append("\n")
+                w("".join(block))
         
         # 表格清单（不包含上下文）
-        tables = doc_data.get("tables", [])
         if tables:
-            summary += "## 表格清单\n\n"
+            w("## 表格清单\n\n")
+            
+            # 一次正向遍历确定每个表格所在的章节（最近的一级标题）
+            section_by_table = {}
+            current_h1 = "未知章节"
+            for item in structured_content:
+                get = item.get
+                item_type = get("type")
+                if item_type == "heading":
+                    if get("level", 1) == 1:
+                        current_h1 = get("text", "未知章节")
+                elif item_type == "table":
+                    section_by_table.setdefault(get("table_id"), current_h1)
+            
             for idx, table_data in enumerate(tables, 1):
                 table_id = table_data.get("table_id", f"table_{idx}")
                 headers = table_data.get("headers", [])
                 rows = table_data.get("rows", [])
                 
-                # 查找表格所在的章节
-                section_title = "未知章节"
-                structured_content = doc_data.get("structured_content", [])
-                # 可以通过structured_content查找表格所在的章节
-                for item_idx, item in enumerate(structured_content):
-                    if item.get("type") == "table" and item.get("table_id") == table_id:
-                        # 向前查找最近的章节标题
-                        for i in range(item_idx, -1, -1):
-                            prev_item = structured_content[i]
-                            if prev_item.get("type") == "heading" and prev_item.get("level", 1) == 1:
-                                section_title = prev_item.get("text", "未知章节")
-                                break
-                        break
+                # 表格所在的章节
+                section_title = section_by_table.get(table_id, "未知章节")
                 
-                summary += f"### 表格 {idx} ({table_id})\n\n"
-                summary += f"- **位置**: {section_title}\n"
-                summary += f"- **行列数**: {len(rows)} 行 × {len(headers)} 列\n"
+                block = [
+                    f"### 表格 {idx} ({table_id})\n\n",
+                    f"- **位置**: {section_title}\n",
+                    f"- **行列数**: {len(rows)} 行 × {len(headers)} 列\n"
+                ]
                 
                 # 内容摘要（前3行）
                 if headers and rows:
-                    summary += "\n**内容摘要**:\n\n"
+                    block.append("\n**内容摘要**:\n\n")
                     # 表头
-                    header_row = "| " + " | ".join(str(h) for h in headers) + " |\n"
-                    separator = "| " + " | ".join(["---"] * len(headers)) + " |\n"
-                    summary += header_row + separator
+                    block.append("| {} |\n".format(" | ".join([str(h) for h in headers])))
+                    block.append("| {} |\n".format(" | ".join(["---"] * len(headers))))
                     # 前3行数据
-                    for row in rows[:3]:
-                        row_str = "| " + " | ".join(str(cell) for cell in row) + " |\n"
-                        summary += row_str
+                    block.append("\n".join(["| {} |".format(" | ".join([str(cell) for cell in row])) for row in rows[:3]]) + "\n")
                     if len(rows) > 3:
-                        summary += f"| ... (还有 {len(rows) - 3} 行) |\n"
-                    summary += "\n"
+                        block.append(f"| ... (还有 {len(rows) - 3} 行) |\n")
+                    block.append("\n")
                 
-                summary += "\n"
+                block.append("\n")
+                w("".join(block))
         
         # 嵌入文档清单
-        ole_objects = doc_data.get("ole_objects", [])
         if ole_objects:
-            summary += "## 嵌入文档清单\n\n"
+            w("## 嵌入文档清单\n\n")
             for idx, ole in enumerate(ole_objects, 1):
                 ole_id = ole.get("ole_id", f"ole_{idx}")
                 ole_name = ole.get("name", "嵌入文档")
                 ole_type = ole.get("type", "未知类型")
                 
-                summary += f"### 嵌入文档 {idx} ({ole_id})\n\n"
-                summary += f"- **名称**: {ole_name}\n"
-                summary += f"- **类型**: {ole_type}\n"
+                block = [
+                    f"### 嵌入文档 {idx} ({ole_id})\n\n",
+                    f"- **名称**: {ole_name}\n",
+                    f"- **类型**: {ole_type}\n"
+                ]
                 
                 if upload_id:
                     preview_url = f"/api/document-upload/{upload_id}/ole/{ole_id}?view=preview"
                     download_url = f"/api/document-upload/{upload_id}/ole/{ole_id}?view=download"
-                    summary += f"- **链接**: [查看]({preview_url}) | [下载]({download_url})\n"
+                    block.append(f"- **链接**: [查看]({preview_url}) | [下载]({download_url})\n")
                 
-                summary += "\n"
+                block.append("\n")
+                w("".join(block))
         
         # 链接清单（可选）
-        links = doc_data.get("links", [])
         if links:
-            summary += "## 链接清单\n\n"
-            seen_links = set()
+            w("## 链接清单\n\n")
+            # 按 (url, text) 去重，保留首次出现的链接及其顺序
+            unique_links = {}
             for link in links:
-                link_key = (link.get('url', ''), link.get('text', ''))
-                if link_key not in seen_links:
-                    seen_links.add(link_key)
-                    url = link.get('url', '')
-                    text = link.get('text', url)
-                    link_type = link.get('type', 'external')
-                    summary += f"- [{text}]({url}) ({link_type})\n"
-            summary += "\n"
-        
-        return summary
+                unique_links.setdefault((link.get('url', ''), link.get('text', '')), link)
+            w("".join([
+                f"- [{link.get('text', url)}]({url}) ({link.get('type', 'external')})\n"
+                for (url, _), link in unique_links.items()
+            ]))
+            w("\n")
+        
+        return buf.getvalue()
     
     @staticmethod
     def _generate_document_summary(doc_data: Dict) -> str:
@@ -2779,6 +2888,9 @@ class WordDocumentService:
             # Step 3: 获取 Graphiti 实例
             graphiti = get_graphiti_instance(provider)
             
+            # 原始文件名（只解析一次路径）
+            original_filename = os.path.basename(file_path)
+            
             # 提取基础标识和版本号
             base_name = WordDocumentService._extract_base_name(document_name)
             version, version_number = WordDocumentService._extract_version(document_name)
@@ -2787,12 +2899,13 @@ class WordDocumentService:
             # Graphiti 要求 group_id 只能包含 alphanumeric characters, dashes, or underscores
             safe_base_name = WordDocumentService._sanitize_group_id(base_name)
             
-            # 使用文档创建日期或当前日期
+            # 使用文档创建日期或当前日期（同一文档的所有 Episode 共用一个时间点）
             doc_date = doc_data["metadata"].get("created")
+            now = datetime.now()
             if doc_date and isinstance(doc_date, datetime):
                 date_str = doc_date.strftime('%Y%m%d')
             else:
-                date_str = datetime.now().strftime('%Y%m%d')
+                date_str = now.strftime('%Y%m%d')
             
             # 生成基础 group_id（所有版本共享）
             group_id = f"doc_{safe_base_name}_{date_str}"
@@ -2800,13 +2913,16 @@ class WordDocumentService:
             logger.info(f"文档版本: {version} (版本号: {version_number})")
             logger.info(f"文档 group_id: {group_id}")
             
+            # 所有 Episode 共用的参考时间（文档创建时间或当前时间），只计算一次
+            reference_time = doc_date or now
+            
             # Step 4: 创建文档级 Episode（提取文档级别的实体）
             document_summary = WordDocumentService._generate_document_summary(doc_data)
             document_episode = await graphiti.add_episode(
                 name=f"{document_name}_文档概览",
                 episode_body=document_summary,
-                source_description="Word文档",
-                reference_time=doc_data["metadata"].get("created") or datetime.now(),
+                source_description=_SRC_DOC,
+                reference_time=reference_time,
                 entity_types={
                     "Requirement": ENTITY_TYPES.get("Requirement"),
                     "Document": ENTITY_TYPES.get("Document"),
@@ -2816,88 +2932,104 @@ class WordDocumentService:
             document_episode_uuid = document_episode.episode.uuid
             logger.info(f"文档级 Episode 创建完成: {document_episode_uuid}")
             
-            # 更新文档级 Episode 的版本信息和文件路径
+            # 所有 Episode（文档级及章节/图片/表格）的版本信息和文件路径相同，
+            # 收集 UUID 后一次性批量更新（UNWIND），避免逐个往返
             from app.core.neo4j_client import neo4j_client
-            update_version_query = """
+            batch_update_version_query = """
+            UNWIND $episode_uuids AS episode_uuid
             MATCH (e:Episodic)
-            WHERE e.uuid = $episode_uuid
-            SET e.version = $version,
-                e.version_number = $version_number,
-                e.document_name = $document_name,
-                e.file_path = $file_path,
-                e.original_filename = $original_filename
-            RETURN e.uuid as uuid
+            WHERE e.uuid = episode_uuid
+            SET e += $version_properties
             """
-            neo4j_client.execute_write(update_version_query, {
-                "episode_uuid": document_episode_uuid,
+            version_properties = {
                 "version": version,
                 "version_number": version_number,
                 "document_name": document_name,
                 "file_path": file_path,
-                "original_filename": os.path.basename(file_path)
-            })
-            logger.info(f"已更新文档级 Episode 版本信息和文件路径: version={version}, version_number={version_number}, file_path={file_path}")
-            
-            # 定义更新版本信息的函数（供后续使用）
-            def update_episode_version(episode_uuid: str):
-                neo4j_client.execute_write(update_version_query, {
-                    "episode_uuid": episode_uuid,
-                    "version": version,
-                    "version_number": version_number,
-                    "document_name": document_name,
-                    "file_path": file_path,
-                    "original_filename": os.path.basename(file_path)
-                })
+                "original_filename": original_filename
+            }
+            pending_version_updates = [document_episode_uuid]
             
-            # Step 5: 创建章节级 Episode
-            section_episodes = []
-            for idx, section in enumerate(sections):
-                section_content = WordDocumentService._build_section_content(
-                    section, doc_data, idx
-                )
+            try:
+                # 章节/图片/表格 Episode 只依赖文档级 Episode，彼此之间没有依赖，
+                # 每组并发创建（信号量限制并发数，与 EpisodeProcessor 使用同一配置）
+                from app.core.config import settings
+                semaphore = asyncio.Semaphore(getattr(settings, 'EPISODE_MAX_CONCURRENT', 5))
                 
-                section_episode = await graphiti.add_episode(
-                    name=f"{document_name}_章节_{idx+1}_{section['title'][:20]}",
-                    episode_body=section_content,
-                    source_description="Word文档章节",
-                    reference_time=doc_data["metadata"].get("created") or datetime.now(),
-                    entity_types=ENTITY_TYPES,
-                    edge_types=EDGE_TYPES,
-                    edge_type_map=EDGE_TYPE_MAP,
-                    group_id=group_id,
-                    previous_episode_uuids=[document_episode_uuid]
-                )
+                async def add_episode_bounded(episode_kwargs: Dict[str, Any]):
+                    async with semaphore:
+                        return await graphiti.add_episode(**episode_kwargs)
                 
-                section_episode_uuid = section_episode.episode.uuid
-                section_episodes.append(section_episode_uuid)
+                async def create_episodes(kind: str, episode_kwargs_list: List[Dict[str, Any]]) -> List[str]:
+                    """并发创建一组 Episode，按原顺序返回 UUID；已创建的 Episode 都会记录版本更新"""
+                    results = await asyncio.gather(
+                        *[add_episode_bounded(episode_kwargs) for episode_kwargs in episode_kwargs_list],
+                        return_exceptions=True
+                    )
+                    episode_uuids = []
+                    first_error = None
+                    for idx, result in enumerate(results):
+                        if isinstance(result, BaseException):
+                            if first_error is None:
+                                first_error = result
+                            continue
+                        episode_uuid = result.episode.uuid
+                        episode_uuids.append(episode_uuid)
+                        # 记录待更新版本信息的 Episode
+                        pending_version_updates.append(episode_uuid)
+                        logger.info(f"{kind} {idx+1} Episode 创建完成: {episode_uuid}")
+                    if first_error is not None:
+                        raise first_error
+                    return episode_uuids
                 
-                # 更新章节级 Episode 的版本信息
-                update_episode_version(section_episode_uuid)
+                # Step 5: 创建章节级 Episode
+                section_episode_kwargs = []
+                section_index = WordDocumentService._build_section_index(doc_data["structured_content"])
+                table_markdown_cache = {}
+                for idx, section in enumerate(sections):
+                    short_title = section['title'][:20]
+                    section_episode_kwargs.append({
+                        "name": f"{document_name}_章节_{idx+1}_{short_title}",
+                        "episode_body": WordDocumentService._build_section_content(
+                            section, doc_data, idx,
+                            section_index=section_index, table_markdown_cache=table_markdown_cache
+                        ),
+                        "source_description": _SRC_SECTION,
+                        "reference_time": reference_time,
+                        "entity_types": ENTITY_TYPES,
+                        "edge_types": EDGE_TYPES,
+                        "edge_type_map": EDGE_TYPE_MAP,
+                        "group_id": group_id,
+                        "previous_episode_uuids": [document_episode_uuid]
+                    })
+                section_episodes = await create_episodes("章节", section_episode_kwargs)
                 
-                logger.info(f"章节 {idx+1} Episode 创建完成: {section_episode_uuid}")
-            
-            # Step 6: 处理图片，为每张图片创建独立的Episode
-            image_episodes = []
-            if doc_data["images"]:
-                logger.info(f"开始处理 {len(doc_data['images'])} 张图片")
-                for idx, image in enumerate(doc_data["images"]):
-                    image_id = image.get("image_id", f"image_{idx+1}")
-                    image_desc = image.get("description", f"图片 {idx+1}")
-                    image_context = image.get("context", "")
-                    image_url = f"/api/word-document/{group_id}/images/{image_id}"
-                    
-                    # 获取增强的上下文信息
-                    prev_context = image.get('prev_context', '')
-                    next_context = image.get('next_context', '')
-                    section_title = image.get('section_title', '')
-                    relative_position = image.get('relative_position', 0.0)
-                    match_method = image.get('match_method', 'unknown')
-                    match_confidence = image.get('match_confidence', 0.0)
-                    file_size = image.get('file_size', 0)
-                    file_format = image.get('file_format', 'UNKNOWN')
-                    
-                    # 构建图片Episode的内容（增强版：包含更多元数据和上下文）
-                    image_content = f"""## 图片信息
+                # Step 6: 处理图片，为每张图片创建独立的Episode
+                image_episodes = []
+                if doc_data["images"]:
+                    logger.info(f"开始处理 {len(doc_data['images'])} 张图片")
+                    image_episode_kwargs = []
+                    for idx, image in enumerate(doc_data["images"]):
+                        image_id = image.get("image_id", f"image_{idx+1}")
+                        image_desc = image.get("description", f"图片 {idx+1}")
+                        short_desc = image_desc[:20]
+                        image_context = image.get("context", "")
+                        image_url = f"/api/word-document/{group_id}/images/{image_id}"
+                        
+                        # 获取增强的上下文信息
+                        prev_context = image.get('prev_context', '')
+                        next_context = image.get('next_context', '')
+                        section_title = image.get('section_title', '')
+                        relative_position = image.get('relative_position', 0.0)
+                        match_method = image.get('match_method', 'unknown')
+                        match_confidence = image.get('match_confidence', 0.0)
+                        file_size = image.get('file_size', 0)
+                        file_format = image.get('file_format', 'UNKNOWN')
+                        
+                        # 构建图片Episode的内容（增强版：包含更多元数据和上下文）
+                        image_buf = io.StringIO()
+                        w = image_buf.write
+                        w(f"""## 图片信息
 
 **图片ID**: {image_id}
 **描述**: {image_desc}
@@ -2908,63 +3040,58 @@ class WordDocumentService:
 **匹配方法**: {match_method}
 **匹配置信度**: {match_confidence:.2f}
 **文档位置**: {relative_position:.1%}
-"""
-                    
-                    # 添加章节信息
-                    if section_title:
-                        image_content += f"**所属章节**: {section_title}\n\n"
-                    
-                    # 添加完整的上下文信息
-                    image_content += "### 上下文信息\n\n"
-                    if prev_context:
-                        image_content += f"**前文**: {prev_context}\n\n"
-                    if image_context:
-                        image_content += f"**当前段落**: {image_context}\n\n"
-                    if next_context:
-                        image_content += f"**后文**: {next_context}\n\n"
-                    if not prev_context and not image_context and not next_context:
-                        image_content += "无上下文信息\n\n"
-                    
-                    image_content += f"""### 图片链接
+""")
+                        
+                        # 添加章节信息
+                        if section_title:
+                            w(f"**所属章节**: {section_title}\n\n")
+                        
+                        # 添加完整的上下文信息
+                        w("### 上下文信息\n\n")
+                        if prev_context:
+                            w(f"**前文**: {prev_context}\n\n")
+                        if image_context:
+                            w(f"**当前段落**: {image_context}\n\n")
+                        if next_context:
+                            w(f"**后文**: {next_context}\n\n")
+                        if not prev_context and not image_context and not next_context:
+                            w("无上下文信息\n\n")
+                        
+                        w(f"""### 图片链接
 ![{image_desc}]({image_url})
 
 ### 图片说明
 这是一张从Word文档中提取的图片，位于文档的相应位置（位置: {relative_position:.1%}）。图片可能包含流程图、示意图、图表或其他可视化内容。
 
 **匹配信息**: 通过{match_method}方法匹配，置信度为{match_confidence:.0%}。
-"""
+""")
+                        
+                        image_episode_kwargs.append({
+                            "name": f"{document_name}_图片_{idx+1}_{short_desc}",
+                            "episode_body": image_buf.getvalue(),
+                            "source_description": _SRC_IMAGE,
+                            "reference_time": reference_time,
+                            "entity_types": ENTITY_TYPES,
+                            "edge_types": EDGE_TYPES,
+                            "edge_type_map": EDGE_TYPE_MAP,
+                            "group_id": group_id,
+                            "previous_episode_uuids": [document_episode_uuid]
+                        })
                     
                     # 创建图片Episode
-                    image_episode = await graphiti.add_episode(
-                        name=f"{document_name}_图片_{idx+1}_{image_desc[:20]}",
-                        episode_body=image_content,
-                        source_description="Word文档图片",
-                        reference_time=doc_data["metadata"].get("created") or datetime.now(),
-                        entity_types=ENTITY_TYPES,
-                        edge_types=EDGE_TYPES,
-                        edge_type_map=EDGE_TYPE_MAP,
-                        group_id=group_id,
-                        previous_episode_uuids=[document_episode_uuid]
-                    )
-                    
-                    image_episode_uuid = image_episode.episode.uuid
-                    image_episodes.append(image_episode_uuid)
-                    
-                    # 更新图片 Episode 的版本信息
-                    update_episode_version(image_episode_uuid)
-                    
-                    logger.info(f"图片 {idx+1} Episode 创建完成: {image_episode_uuid}")
-            
-            # Step 7: 处理表格，为每个表格创建独立的Episode
-            table_episodes = []
-            if doc_data["tables"]:
-                logger.info(f"开始处理 {len(doc_data['tables'])} 个表格")
-                for idx, table_data in enumerate(doc_data["tables"]):
-                    # 格式化表格为标准Markdown格式（用于Episode内容）
-                    table_markdown = WordDocumentService._format_table_as_markdown(table_data)
-                    
-                    # 构建表格Episode的内容
-                    table_content = f"""## 表格信息
+                    image_episodes = await create_episodes("图片", image_episode_kwargs)
+                
+                # Step 7: 处理表格，为每个表格创建独立的Episode
+                table_episodes = []
+                if doc_data["tables"]:
+                    logger.info(f"开始处理 {len(doc_data['tables'])} 个表格")
+                    table_episode_kwargs = []
+                    for idx, table_data in enumerate(doc_data["tables"]):
+                        # 格式化表格为标准Markdown格式（用于Episode内容）
+                        table_markdown = WordDocumentService._get_table_markdown(table_data, table_markdown_cache)
+                        
+                        # 构建表格Episode的内容
+                        table_content = f"""## 表格信息
 
 **表格序号**: {idx+1}
 **表格ID**: {table_data.get('table_id', f'table_{idx+1}')}
@@ -2978,27 +3105,34 @@ class WordDocumentService:
 ### 表格说明
 这是从Word文档中提取的表格数据，使用标准Markdown表格格式，包含结构化的信息。
 """
+                        
+                        table_episode_kwargs.append({
+                            "name": f"{document_name}_表格_{idx+1}",
+                            "episode_body": table_content,
+                            "source_description": _SRC_TABLE,
+                            "reference_time": reference_time,
+                            "entity_types": ENTITY_TYPES,
+                            "edge_types": EDGE_TYPES,
+                            "edge_type_map": EDGE_TYPE_MAP,
+                            "group_id": group_id,
+                            "previous_episode_uuids": [document_episode_uuid]
+                        })
                     
                     # 创建表格Episode
-                    table_episode = await graphiti.add_episode(
-                        name=f"{document_name}_表格_{idx+1}",
-                        episode_body=table_content,
-                        source_description="Word文档表格",
-                        reference_time=doc_data["metadata"].get("created") or datetime.now(),
-                        entity_types=ENTITY_TYPES,
-                        edge_types=EDGE_TYPES,
-                        edge_type_map=EDGE_TYPE_MAP,
-                        group_id=group_id,
-                        previous_episode_uuids=[document_episode_uuid]
-                    )
-                    
-                    table_episode_uuid = table_episode.episode.uuid
-                    table_episodes.append(table_episode_uuid)
-                    
-                    # 更新表格 Episode 的版本信息
-                    update_episode_version(table_episode_uuid)
-                    
-                    logger.info(f"表格 {idx+1} Episode 创建完成: {table_episode_uuid}")
+                    table_episodes = await create_episodes("表格", table_episode_kwargs)
+                
+            finally:
+                # 批量更新所有 Episode 的版本信息（即使中途失败，已创建的 Episode 也会更新）
+                # 写入失败只记录警告，不覆盖创建Episode过程中抛出的原始异常
+                if pending_version_updates:
+                    try:
+                        await neo4j_client.execute_write_async(batch_update_version_query, {
+                            "episode_uuids": pending_version_updates,
+                            "version_properties": version_properties
+                        })
+                        logger.info(f"已批量更新 {len(pending_version_updates)} 个 Episode 的版本信息和文件路径: version={version}, version_number={version_number}, file_path={file_path}")
+                    except Exception as e:
+                        logger.warning(f"批量更新 Episode 版本信息失败: {e}")
             
             return {
                 "success": True,
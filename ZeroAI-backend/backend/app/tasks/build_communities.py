@@ -1,10 +1,20 @@
 """
 构建Community任务（Celery任务）
 """
+import asyncio
+import json
 import logging
+import queue
+import threading
+import time
+import httpx
+from concurrent.futures import as_completed
 from datetime import datetime
+from functools import lru_cache
 from typing import List, Optional
 from celery import Task
+from sqlalchemy import update
+from openai import AsyncOpenAI
 from app.core.celery_app import celery_app
 from app.core.mysql_client import SessionLocal
 from app.models.task_queue import TaskQueue, TaskStatus, TaskType
@@ -13,9 +23,116 @@ from app.core.graphiti_client import get_graphiti_instance
 from app.core.neo4j_client import neo4j_client
 from app.core.utils import serialize_neo4j_properties
 from app.core.llm_client import get_llm_client
+from app.core.config import settings
+from app.core.redis_client import get_cached_translation, cache_translation
 
 logger = logging.getLogger(__name__)
 
+# Cypher 正则（=~ 为整串匹配，(?s) 使 . 匹配换行）
+_CYPHER_LATIN_PATTERN = r'(?s).*[A-Za-z].*'
+_CYPHER_CJK_PATTERN = '(?s).*[\u4e00-\u9fff].*'
+
+# 每次LLM调用批量翻译的Community条数上限，以及单批原文总字符数上限（控制prompt长度）
+TRANSLATE_BATCH_SIZE = 20
+TRANSLATE_BATCH_MAX_CHARS = 6000
+
+# Community查询的公共部分：统计每个Community包含的实体数量，
+# 并在数据库端判断名称/摘要是否需要翻译（含英文字母且不含中文）
+_COMMUNITY_PROJECTION = """
+    OPTIONAL MATCH (c)-[:HAS_MEMBER|CONTAINS]->(e1:Entity)
+    OPTIONAL MATCH (e2:Entity)-[:BELONGS_TO]->(c)
+    WITH c, count(DISTINCT e1) + count(DISTINCT e2) as entity_count,
+         coalesce(c.name, '') as name_text, coalesce(c.summary, '') as summary_text
+    RETURN c.uuid as uuid, c.name as name, c.summary as summary, c.group_id as group_id, entity_count,
+           (name_text =~ $latin_pattern AND NOT name_text =~ $cjk_pattern) as name_needs_translation,
+           (summary_text =~ $latin_pattern AND NOT summary_text =~ $cjk_pattern) as summary_needs_translation
+    ORDER BY name
+"""
+
+# Graphiti 将 Community 的 group_id 存为字符串，按值匹配即可命中 community_group_id 索引
+COMMUNITIES_BY_GROUP_QUERY = """
+    MATCH (c:Community)
+    WHERE c.group_id = $group_id
+""" + _COMMUNITY_PROJECTION
+
+COMMUNITIES_BY_GROUPS_QUERY = """
+    MATCH (c:Community)
+    WHERE c.group_id IN $group_ids
+""" + _COMMUNITY_PROJECTION
+
+# 兼容旧数据（group_id 为列表或包含多个文档标识）的模糊匹配，仅在精确匹配无结果时使用
+COMMUNITIES_BY_GROUP_FUZZY_QUERY = """
+    MATCH (c:Community)
+    WHERE c.group_id IS NOT NULL AND
+          (toString(c.group_id) CONTAINS $group_id OR
+           $group_id IN c.group_id)
+""" + _COMMUNITY_PROJECTION
+
+COMMUNITIES_BY_GROUPS_FUZZY_QUERY = """
+    MATCH (c:Community)
+    WHERE c.group_id IS NOT NULL AND
+          any(gid IN $group_ids WHERE
+              toString(c.group_id) CONTAINS gid OR
+              gid IN c.group_id)
+""" + _COMMUNITY_PROJECTION
+
+
+# 在后台线程中常驻运行的事件循环，供同一个worker进程内的所有任务复用
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    """获取后台事件循环（首次使用时创建，避免在fork前启动线程）"""
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="build-communities-loop", daemon=True).start()
+            _background_loop = loop
+    return _background_loop
+
+
+def run_in_background_loop(coro):
+    """在后台事件循环中执行协程，并阻塞等待结果"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_background_loop()).result()
+
+
+@lru_cache(maxsize=1)
+def _create_translate_client(api_base_url: str, api_key: str, max_connections: int):
+    """
+    创建用于翻译的本地大模型客户端，连接池大小与并发数一致
+    
+    按配置值缓存：配置不变时所有任务复用同一个客户端（及其连接池），
+    配置更新后自动创建新的客户端。客户端在后台事件循环中使用，随worker进程常驻
+    """
+    local_base_url = api_base_url.rstrip('/')
+    if not local_base_url.endswith("/v1"):
+        if "/v1" not in local_base_url:
+            local_base_url = f"{local_base_url}/v1"
+    
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=local_base_url,
+        timeout=60.0,
+        http_client=httpx.AsyncClient(
+            timeout=60.0,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            )
+        )
+    )
+
+
+def _get_translate_client():
+    """获取翻译客户端（固定使用本地大模型）"""
+    return _create_translate_client(
+        settings.LOCAL_LLM_API_BASE_URL,
+        settings.LOCAL_LLM_API_KEY,
+        settings.LOCAL_LLM_CONCURRENCY
+    )
+
 
 class ProgressTask(Task):
     """支持进度更新的任务基类"""
@@ -33,23 +150,100 @@ class ProgressTask(Task):
             )
 
 
-def update_task_progress(db, task_id: str, progress: int, current_step: str, completed_steps: int = None, total_steps: int = None):
-    """更新数据库中的任务进度"""
+# 高频进度更新（如逐条翻译）写库的最小间隔（秒）
+PROGRESS_WRITE_INTERVAL = 0.5
+_last_progress_write = {}
+
+
+def update_task_progress(db, task_id: str, progress: int, current_step: str, completed_steps: int = None, total_steps: int = None, throttle: bool = False):
+    """
+    更新数据库中的任务进度
+    
+    直接执行 UPDATE 语句，不再先查询任务行；throttle=True 时距上次写入不足
+    PROGRESS_WRITE_INTERVAL 的更新会被跳过（前端仍可通过Celery状态获取实时进度）
+    """
+    now = time.monotonic()
+    if throttle and now - _last_progress_write.get(task_id, 0.0) < PROGRESS_WRITE_INTERVAL:
+        return
+    
+    values = {"progress": progress or 0, "current_step": current_step}
+    if completed_steps is not None:
+        values["completed_steps"] = completed_steps
+    if total_steps is not None:
+        values["total_steps"] = total_steps
     try:
-        task = db.query(TaskQueue).filter(TaskQueue.task_id == task_id).first()
-        if task:
-            task.progress = progress or 0
-            task.current_step = current_step
-            if completed_steps is not None:
-                task.completed_steps = completed_steps
-            if total_steps is not None:
-                task.total_steps = total_steps
-            db.commit()
+        db.execute(update(TaskQueue).where(TaskQueue.task_id == task_id).values(**values))
+        db.commit()
+        _last_progress_write[task_id] = now
     except Exception as e:
         logger.error(f"更新任务进度失败: {e}", exc_info=True)
         db.rollback()
 
 
+# 进度写库放到后台线程中执行，任务主流程只负责入队，不再等待MySQL往返
+_progress_queue = queue.Queue()
+_progress_writer = None
+_progress_writer_lock = threading.Lock()
+
+
+def _drain_progress_queue():
+    """后台写入进度：一次取出队列中积压的所有更新，同一任务只写最新的一条"""
+    while True:
+        pending = [_progress_queue.get()]
+        while True:
+            try:
+                pending.append(_progress_queue.get_nowait())
+            except queue.Empty:
+                break
+        
+        latest = {}
+        for item in pending:
+            latest[item[0]] = item
+        
+        db = SessionLocal()
+        try:
+            for task_id, args, kwargs in latest.values():
+                update_task_progress(db, task_id, *args, **kwargs)
+        finally:
+            db.close()
+            for _ in pending:
+                _progress_queue.task_done()
+
+
+def queue_task_progress(task_id: str, *args, **kwargs):
+    """将进度更新放入后台写入队列，参数同 update_task_progress（不含db）"""
+    global _progress_writer
+    with _progress_writer_lock:
+        if _progress_writer is None:
+            # 首次使用时启动写入线程，避免在fork前启动线程
+            _progress_writer = threading.Thread(target=_drain_progress_queue, name="task-progress-writer", daemon=True)
+            _progress_writer.start()
+    _progress_queue.put((task_id, args, kwargs))
+
+
+def flush_task_progress():
+    """等待已入队的进度更新全部写入数据库"""
+    if _progress_writer is not None:
+        _progress_queue.join()
+
+
+def extract_json(text: str, opening: str = "{"):
+    """
+    从LLM返回的文本中提取第一个完整的JSON对象（opening="{"）或数组（opening="["）
+    
+    从每个起始符处尝试增量解析，避免贪婪正则在长输出（如Thinking模式）上的回溯
+    """
+    decoder = json.JSONDecoder()
+    start = text.find(opening)
+    while start != -1:
+        try:
+            obj, _ = decoder.raw_decode(text, start)
+            return obj
+        except json.JSONDecodeError:
+            start = text.find(opening, start + 1)
+    return None
+
+
 @celery_app.task(bind=True, base=ProgressTask, name="build_communities_task")
 def build_communities_task(
     self,
@@ -84,7 +278,7 @@ def build_communities_task(
         
         # 更新进度：初始化（5%）
         self.update_progress(5, "初始化：验证参数和文档")
-        update_task_progress(db, task_id, 5, "初始化：验证参数和文档", 0, 10)
+        queue_task_progress(task_id, 5, "初始化：验证参数和文档", 0, 10)
         
         # 查询文档
         document = db.query(DocumentUpload).filter(DocumentUpload.id == upload_id).first()
@@ -111,105 +305,85 @@ def build_communities_task(
         
         # 更新进度：开始构建（20%）
         self.update_progress(20, f"开始构建Community（{'当前文档' if scope == 'current' else '跨文档'}）")
-        update_task_progress(db, task_id, 20, f"开始构建Community", 1, 10)
+        queue_task_progress(task_id, 20, f"开始构建Community", 1, 10)
         
         # 获取Graphiti实例
-        import asyncio
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
         graphiti = get_graphiti_instance(provider)
         
         # 构建Community
         logger.info(f"开始构建Community，group_ids={target_group_ids}")
-        communities_result = loop.run_until_complete(
+        communities_result = run_in_background_loop(
             graphiti.build_communities(group_ids=target_group_ids)
         )
         logger.info(f"Graphiti build_communities 调用完成")
         
         # 更新进度：查询结果（70%）
         self.update_progress(70, "查询Neo4j中的Community节点")
-        update_task_progress(db, task_id, 70, "查询Neo4j中的Community节点", 2, 10)
+        queue_task_progress(task_id, 70, "查询Neo4j中的Community节点", 2, 10)
         
         # 直接从Neo4j查询Community节点
-        if len(target_group_ids) == 1:
-            communities_query = """
-            MATCH (c:Community)
-            WHERE c.group_id = $group_id OR 
-                  (c.group_id IS NOT NULL AND 
-                   (toString(c.group_id) CONTAINS $group_id OR 
-                    $group_id IN c.group_id))
-            RETURN c.uuid as uuid, c.name as name, c.summary as summary, c.group_id as group_id
-            ORDER BY c.name
-            """
-            communities_data = neo4j_client.execute_query(communities_query, {
-                "group_id": target_group_ids[0]
-            })
-        else:
-            communities_query = """
-            MATCH (c:Community)
-            WHERE any(gid IN $group_ids WHERE 
-              c.group_id = gid OR 
-              (c.group_id IS NOT NULL AND 
-               (toString(c.group_id) CONTAINS gid OR 
-                gid IN c.group_id)))
-            RETURN c.uuid as uuid, c.name as name, c.summary as summary, c.group_id as group_id
-            ORDER BY c.name
-            """
-            communities_data = neo4j_client.execute_query(communities_query, {
-                "group_ids": target_group_ids
-            })
-        
-        logger.info(f"从Neo4j查询到 {len(communities_data)} 个Community节点")
+        def iter_communities():
+            """流式返回Community记录；精确匹配无结果时回退到兼容旧数据的模糊匹配"""
+            params = {
+                "latin_pattern": _CYPHER_LATIN_PATTERN,
+                "cjk_pattern": _CYPHER_CJK_PATTERN
+            }
+            if scope == "current":
+                params["group_id"] = target_group_ids[0]
+                exact_query, fuzzy_query = COMMUNITIES_BY_GROUP_QUERY, COMMUNITIES_BY_GROUP_FUZZY_QUERY
+            else:
+                params["group_ids"] = target_group_ids
+                exact_query, fuzzy_query = COMMUNITIES_BY_GROUPS_QUERY, COMMUNITIES_BY_GROUPS_FUZZY_QUERY
+            
+            found = False
+            for record in neo4j_client.execute_query_stream(exact_query, params):
+                found = True
+                yield record
+            if not found:
+                logger.info(f"按group_id精确匹配未找到Community，尝试模糊匹配: {target_group_ids}")
+                yield from neo4j_client.execute_query_stream(fuzzy_query, params)
         
         # 更新进度：翻译summary（85%）
         self.update_progress(85, "翻译英文summary为中文")
-        update_task_progress(db, task_id, 85, "翻译英文summary为中文", 3, 10)
+        queue_task_progress(task_id, 85, "翻译英文summary为中文", 3, 10)
         
         # 翻译英文summary为中文
-        import re
-        def is_mostly_english(text):
-            if not text:
-                return False
-            english_chars = len(re.findall(r'[a-zA-Z]', text))
-            total_chars = len(re.findall(r'[a-zA-Z\u4e00-\u9fff]', text))
-            if total_chars == 0:
-                return False
-            return english_chars / total_chars > 0.5
+        def apply_translation(community_data, translated, need_translate_name, need_translate_summary):
+            """将翻译结果写回Community数据"""
+            if need_translate_name and "name" in translated:
+                community_data["name"] = translated["name"]
+            if need_translate_summary and "summary" in translated:
+                community_data["summary"] = translated["summary"]
         
-        total_communities = len(communities_data)
-        translated_count = 0
+        # 使用信号量控制同时发往本地大模型的请求数
+        translate_semaphore = asyncio.Semaphore(settings.LOCAL_LLM_CONCURRENCY)
+        openai_client = None
         
-        for idx, community_data in enumerate(communities_data):
-            comm_summary = community_data.get("summary", "")
-            comm_name = community_data.get("name", "")
-            community_uuid = community_data.get("uuid")
+        async def translate_batch(items) -> dict:
+            """
+            在一次LLM调用中翻译一批Community
             
-            need_translate_name = is_mostly_english(comm_name) and not any('\u4e00' <= c <= '\u9fff' for c in comm_name)
-            need_translate_summary = is_mostly_english(comm_summary) and not any('\u4e00' <= c <= '\u9fff' for c in comm_summary)
+            Args:
+                items: [((名称, 摘要), need_translate_name, need_translate_summary), ...]
             
-            if need_translate_name or need_translate_summary:
+            Returns:
+                (名称, 摘要) -> 翻译结果；解析失败或缺失的条目不在结果中
+            """
+            payload = []
+            for item_id, ((comm_name, comm_summary), need_translate_name, need_translate_summary) in enumerate(items):
+                entry = {"id": item_id}
+                if need_translate_name:
+                    entry["name"] = comm_name
+                if need_translate_summary:
+                    entry["summary"] = comm_summary
+                payload.append(entry)
+            
+            async with translate_semaphore:
                 try:
-                    translate_prompt = "请将以下内容翻译成中文，保持原意不变：\n\n"
-                    if need_translate_name:
-                        translate_prompt += f"名称: {comm_name}\n"
-                    if need_translate_summary:
-                        translate_prompt += f"摘要: {comm_summary}\n"
-                    translate_prompt += "\n请以JSON格式返回，格式：{\"name\": \"翻译后的名称\", \"summary\": \"翻译后的摘要\"}"
-                    
-                    # 使用LLM翻译（固定使用本地大模型）
-                    from openai import AsyncOpenAI
-                    from app.core.config import settings
-                    
-                    local_base_url = settings.LOCAL_LLM_API_BASE_URL.rstrip('/')
-                    if not local_base_url.endswith("/v1"):
-                        if "/v1" not in local_base_url:
-                            local_base_url = f"{local_base_url}/v1"
-                    
-                    openai_client = AsyncOpenAI(
-                        api_key=settings.LOCAL_LLM_API_KEY,
-                        base_url=local_base_url,
-                        timeout=60.0
+                    translate_prompt = (
+                        "请将以下JSON数组中每个对象的name/summary字段翻译成中文，保持原意不变，id保持不变：\n\n"
+                        f"{json.dumps(payload, ensure_ascii=False)}\n\n"
+                        "请按相同顺序以JSON数组格式返回，格式：[{\"id\": 0, \"name\": \"翻译后的名称\", \"summary\": \"翻译后的摘要\"}, ...]"
                     )
                     
                     # 构建翻译请求参数
@@ -225,35 +399,119 @@ def build_communities_task(
                     if use_thinking:
                         translate_params["extra_body"] = {"thinking": True}
                     
-                    translate_response = loop.run_until_complete(
-                        openai_client.chat.completions.create(**translate_params)
-                    )
+                    translate_response = await openai_client.chat.completions.create(**translate_params)
                     translate_result = translate_response.choices[0].message.content
                     
-                    # 解析翻译结果
-                    import json as json_lib
-                    json_match = re.search(r'\{.*\}', translate_result, re.DOTALL)
-                    if json_match:
-                        translated = json_lib.loads(json_match.group())
-                        if need_translate_name and "name" in translated:
-                            community_data["name"] = translated["name"]
-                        if need_translate_summary and "summary" in translated:
-                            community_data["summary"] = translated["summary"]
-                        translated_count += 1
+                    # 解析翻译结果，按id对应回原条目
+                    translated_list = extract_json(translate_result, "[")
+                    if not isinstance(translated_list, list):
+                        logger.warning(f"批量翻译 {len(items)} 个Community失败: 未能解析返回的JSON数组")
+                        return {}
+                    
+                    results = {}
+                    for translated in translated_list:
+                        if not isinstance(translated, dict):
+                            continue
+                        item_id = translated.get("id")
+                        if not isinstance(item_id, int) or not 0 <= item_id < len(items):
+                            continue
+                        key = items[item_id][0]
+                        translated = {k: v for k, v in translated.items() if k in ("name", "summary")}
+                        results[key] = translated
+                    return results
                 except Exception as e:
-                    logger.warning(f"翻译Community {community_uuid} 失败: {e}")
+                    logger.warning(f"批量翻译 {len(items)} 个Community失败: {e}")
+                    return {}
+        
+        pending_batch = []
+        pending_batch_chars = 0
+        batch_futures = {}  # Future -> 该批次的条目数
+        
+        def submit_pending_batch():
+            """将当前累积的批次提交到后台事件循环"""
+            nonlocal pending_batch, pending_batch_chars, openai_client
+            if not pending_batch:
+                return
+            if openai_client is None:
+                openai_client = _get_translate_client()
+            future = asyncio.run_coroutine_threadsafe(translate_batch(pending_batch), _get_background_loop())
+            batch_futures[future] = len(pending_batch)
+            pending_batch = []
+            pending_batch_chars = 0
+        
+        # 流式读取查询结果，需要翻译的Community凑满一批即提交到后台事件循环，
+        # 使Neo4j结果传输与LLM翻译并行进行。
+        # 按 (名称, 摘要) 去重：内容相同的Community只翻译一次，
+        # translate_groups: (名称, 摘要) -> [need_name, need_summary, 成员列表, 翻译结果]
+        communities_data = []
+        translate_groups = {}
+        cached_groups = 0
+        for community_data in iter_communities():
+            communities_data.append(community_data)
+            
+            need_translate_name = bool(community_data.get("name_needs_translation"))
+            need_translate_summary = bool(community_data.get("summary_needs_translation"))
+            if not (need_translate_name or need_translate_summary):
+                continue
+            
+            key = (community_data.get("name", ""), community_data.get("summary", ""))
+            group = translate_groups.get(key)
+            if group is not None:
+                group[2].append(community_data)
+                continue
             
-            # 更新翻译进度
-            if total_communities > 0:
-                translate_progress = 85 + int((idx + 1) / total_communities * 10)
-                self.update_progress(translate_progress, f"翻译进度 ({idx + 1}/{total_communities})")
-                update_task_progress(db, task_id, translate_progress, f"翻译进度 ({idx + 1}/{total_communities})", 3 + idx + 1, 10)
+            # 优先使用Redis中缓存的翻译
+            translation = get_cached_translation(key[0], key[1], settings.LOCAL_LLM_MODEL)
+            if translation is not None:
+                cached_groups += 1
+            else:
+                item_chars = len(key[0] or "") + len(key[1] or "")
+                if pending_batch and pending_batch_chars + item_chars > TRANSLATE_BATCH_MAX_CHARS:
+                    submit_pending_batch()
+                pending_batch.append((key, need_translate_name, need_translate_summary))
+                pending_batch_chars += item_chars
+                if len(pending_batch) >= TRANSLATE_BATCH_SIZE:
+                    submit_pending_batch()
+            translate_groups[key] = [need_translate_name, need_translate_summary, [community_data], translation]
+        submit_pending_batch()
+        
+        logger.info(f"从Neo4j查询到 {len(communities_data)} 个Community节点")
+        if cached_groups:
+            logger.info(f"命中翻译缓存: {cached_groups} 条")
+        
+        # 等待翻译完成并更新翻译进度（按条目计数）
+        total_todo = sum(batch_futures.values())
+        finished_count = 0
+        for future in as_completed(batch_futures):
+            for key, translated in future.result().items():
+                group = translate_groups[key]
+                group[3] = translated
+                # 只缓存包含全部待翻译字段的结果，避免部分翻译被长期复用
+                # 缓存写入在当前线程进行，不阻塞后台事件循环
+                if (not group[0] or "name" in translated) and (not group[1] or "summary" in translated):
+                    cache_translation(key[0], key[1], settings.LOCAL_LLM_MODEL, translated)
+            finished_count += batch_futures[future]
+            translate_progress = 85 + int(finished_count / total_todo * 10)
+            self.update_progress(translate_progress, f"翻译进度 ({finished_count}/{total_todo})")
+            queue_task_progress(
+                task_id, translate_progress, f"翻译进度 ({finished_count}/{total_todo})", 3 + finished_count, 10,
+                throttle=finished_count < total_todo
+            )
+        
+        total_communities = len(communities_data)
+        translated_count = 0
+        for need_translate_name, need_translate_summary, members, translation in translate_groups.values():
+            if translation is None:
+                continue
+            for community_data in members:
+                apply_translation(community_data, translation, need_translate_name, need_translate_summary)
+            translated_count += len(members)
         
         logger.info(f"翻译完成: {translated_count}/{total_communities} 个Community")
         
-        # 更新进度：统计实体数量（95%）
-        self.update_progress(95, "统计Community包含的实体数量")
-        update_task_progress(db, task_id, 95, "统计Community包含的实体数量", 8, 10)
+        # 更新进度：汇总结果（95%）
+        self.update_progress(95, "汇总Community结果")
+        queue_task_progress(task_id, 95, "汇总Community结果", 8, 10)
         
         # 构建返回结果
         communities = []
@@ -264,17 +522,7 @@ def build_communities_task(
             if not community_uuid:
                 continue
             
-            # 查询该Community包含的实体数量
-            entity_count_query = """
-            MATCH (c:Community {uuid: $community_uuid})
-            OPTIONAL MATCH (c)-[:HAS_MEMBER|CONTAINS]->(e1:Entity)
-            OPTIONAL MATCH (e2:Entity)-[:BELONGS_TO]->(c)
-            RETURN count(DISTINCT e1) + count(DISTINCT e2) as entity_count
-            """
-            entity_result = neo4j_client.execute_query(entity_count_query, {
-                "community_uuid": community_uuid
-            })
-            entity_count = entity_result[0].get("entity_count", 0) if entity_result else 0
+            entity_count = community_data.get("entity_count") or 0
             total_entities += entity_count
             
             # 处理group_id
@@ -309,7 +557,8 @@ def build_communities_task(
             }
         }
         
-        # 更新任务状态为完成
+        # 更新任务状态为完成（先等待排队中的进度写入完成，避免覆盖最终状态）
+        flush_task_progress()
         if task:
             task.status = TaskStatus.COMPLETED.value
             task.progress = 100
@@ -319,13 +568,13 @@ def build_communities_task(
             task.completed_at = datetime.now()
             db.commit()
         
-        loop.close()
         return result
         
     except Exception as e:
         logger.error(f"构建Community失败: {e}", exc_info=True)
         
         # 更新任务状态为失败
+        flush_task_progress()
         if task:
             task.status = TaskStatus.FAILED.value
             task.error_message = str(e)
@@ -335,5 +584,6 @@ def build_communities_task(
         raise
     
     finally:
+        _last_progress_write.pop(task_id, None)
         db.close()
 
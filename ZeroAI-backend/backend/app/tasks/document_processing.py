@@ -2,8 +2,12 @@
 文档处理任务（Celery任务）
 """
 import os
+import re
+import bisect
 import json
+import mmap
 import logging
+import time
 from datetime import datetime
 from celery import Task
 from app.core.celery_app import celery_app
@@ -13,10 +17,174 @@ from app.models.document_upload import DocumentUpload, DocumentStatus
 from app.services.word_document_service import WordDocumentService
 from app.core.graphiti_client import get_graphiti_instance
 from app.models.graphiti_entities import ENTITY_TYPES, EDGE_TYPES, EDGE_TYPE_MAP
-from app.core.neo4j_client import neo4j_client
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# 批量更新Episode版本信息（UNWIND一次写入多个Episode）
+UPDATE_EPISODE_VERSION_QUERY = """
+UNWIND $episode_uuids AS episode_uuid
+MATCH (e:Episodic)
+WHERE e.uuid = episode_uuid
+SET e.version = $version,
+    e.version_number = $version_number,
+    e.document_name = $document_name,
+    e.file_path = $file_path,
+    e.original_filename = $original_filename
+"""
+
+# 每累计多少个Episode写入一次版本信息
+VERSION_UPDATE_BATCH_SIZE = 100
+
+# 图片/表格Episode正文模板（模块级定义，循环内只做格式化）
+IMAGE_EPISODE_TEMPLATE = """## 图片信息
+
+**图片ID**: {image_id}
+**描述**: {image_desc}
+**文件路径**: {file_path}
+**相对路径**: {relative_path}
+**文件大小**: {file_size} 字节
+**文件格式**: {file_format}
+
+### 图片链接
+![{image_desc}]({image_url})
+
+### 图片说明
+这是一张从Word文档中提取的图片。
+"""
+
+TABLE_EPISODE_TEMPLATE = """## 表格信息
+
+**表格序号**: {table_index}
+**表格ID**: {table_id}
+**行数**: {row_count}
+**列数**: {column_count}
+
+### 表格内容
+
+{table_markdown}
+
+### 表格说明
+这是从Word文档中提取的表格数据，使用标准Markdown表格格式，包含结构化的信息。
+"""
+
+# 一级标题行（"# 标题"，允许行首空白；"## "等下级标题不匹配）
+_H1_HEADING_RE = re.compile(r'^[^\S\n]*# (?=.*\S)(.*)$', re.MULTILINE)
+
+# 中文字符（CJK统一汉字）
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]')
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数（中文通常1 token ≈ 2字符，英文1 token ≈ 4字符）"""
+    if text.isascii():
+        return len(text) // 4
+    chinese_chars = len(_CJK_RE.findall(text))
+    other_chars = len(text) - chinese_chars
+    return (chinese_chars // 2) + (other_chars // 4)
+
+
+# 应用根目录（数据库中保存的文件路径相对于此目录）
+_APP_ROOT = "/app/"
+
+# summary_content.md 中的文档概览章节标题
+OVERVIEW_HEADING = "## 文档概览"
+
+
+def find_overview_span(buf, marker, newline, next_heading):
+    """
+    在summary内容中定位"## 文档概览"章节的 [start, end) 区间
+    
+    buf 可以是 str，也可以是 bytes/mmap（此时其余参数均为bytes）。章节内容为
+    独立的概览标题行之后、下一个"## "标题之前的部分；找不到标题行时返回None。
+    """
+    size = len(buf)
+    pos = buf.find(marker)
+    while pos != -1:
+        line_start = buf.rfind(newline, 0, pos) + 1
+        line_end = buf.find(newline, pos)
+        if line_end == -1:
+            line_end = size
+        # 标题行除空白外没有其他内容
+        if not buf[line_start:pos].strip() and not buf[pos + len(marker):line_end].strip():
+            start = min(line_end + 1, size)
+            end = buf.find(next_heading, start - 1)
+            return start, end if end != -1 else size
+        pos = buf.find(marker, pos + 1)
+    return None
+
+
+def read_summary_overview(summary_path: str):
+    """
+    通过mmap在summary文件中定位"## 文档概览"章节，只解码该章节
+    
+    文件中没有独立的概览标题行时返回None（调用方回退到完整读取）。
+    """
+    with open(summary_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            span = find_overview_span(mm, OVERVIEW_HEADING.encode("utf-8"), b"\n", b"\n## ")
+            if span is None:
+                return None
+            return mm[span[0]:span[1]].decode("utf-8")
+
+
+def resolve_app_path(path: str) -> str:
+    """将相对于应用根目录的路径转换为绝对路径（已是绝对路径则原样返回）"""
+    return path if path.startswith("/") else _APP_ROOT + path
+
+
+# doc_data中唯一的非JSON类型：文档属性里的创建/修改时间（datetime）
+DOC_DATA_DATETIME_FIELDS = ("created", "modified")
+
+
+def load_doc_data(file_path_abs: str, document_id: str) -> dict:
+    """
+    解析Word文档，结果按源文件修改时间缓存到磁盘（JSON）
+    
+    同一文档重复处理（重试、重新入图）时跳过整份Word的重新解析；
+    源文件被替换后修改时间变化，缓存自动失效。
+    缓存位于用户可写的uploads目录下，只使用JSON，不反序列化可执行的对象。
+    """
+    cache_path = resolve_app_path(f"uploads/parsed_content/{document_id}/doc_data.json")
+    mtime = os.path.getmtime(file_path_abs)
+    
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get("file_path") == file_path_abs and cached.get("mtime") == mtime:
+                doc_data = cached["doc_data"]
+                metadata = doc_data.get("metadata") or {}
+                for field in DOC_DATA_DATETIME_FIELDS:
+                    if metadata.get(field):
+                        metadata[field] = datetime.fromisoformat(metadata[field])
+                logger.info(f"使用缓存的文档解析结果: {cache_path}")
+                return doc_data
+        except Exception as e:
+            logger.warning(f"读取文档解析缓存失败，重新解析: {e}")
+    
+    doc_data = WordDocumentService._parse_word_document(file_path_abs, document_id)
+    
+    try:
+        metadata = dict(doc_data.get("metadata") or {})
+        for field in DOC_DATA_DATETIME_FIELDS:
+            if isinstance(metadata.get(field), datetime):
+                metadata[field] = metadata[field].isoformat()
+        # 先完整序列化再写文件，遇到无法序列化的内容时不会留下半个缓存文件
+        payload = json.dumps(
+            {"file_path": file_path_abs, "mtime": mtime, "doc_data": {**doc_data, "metadata": metadata}},
+            ensure_ascii=False
+        )
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+    except Exception as e:
+        logger.warning(f"写入文档解析缓存失败: {e}")
+    
+    return doc_data
+
 
 class ProgressTask(Task):
     """支持进度更新的任务基类"""
@@ -34,8 +202,22 @@ class ProgressTask(Task):
             )
 
 
-def update_task_progress(db, task_id: str, progress: int, current_step: str, completed_steps: int = None, total_steps: int = None):
-    """更新数据库中的任务进度"""
+# 节流写库时两次进度提交之间的最小间隔（秒）
+PROGRESS_WRITE_INTERVAL = 2.0
+_last_progress_write = {}
+
+
+def update_task_progress(db, task_id: str, progress: int, current_step: str, completed_steps: int = None, total_steps: int = None, throttle: bool = False):
+    """
+    更新数据库中的任务进度
+    
+    throttle=True 时距上次写入不足 PROGRESS_WRITE_INTERVAL 的更新会被跳过
+    （前端仍可通过Celery状态获取实时进度）
+    """
+    now = time.monotonic()
+    if throttle and now - _last_progress_write.get(task_id, 0.0) < PROGRESS_WRITE_INTERVAL:
+        return
+    
     try:
         task = db.query(TaskQueue).filter(TaskQueue.task_id == task_id).first()
         if task:
@@ -51,6 +233,7 @@ def update_task_progress(db, task_id: str, progress: int, current_step: str, com
             if total_steps is not None:
                 task.total_steps = total_steps
             db.commit()
+            _last_progress_write[task_id] = now
     except Exception as e:
         logger.error(f"更新任务进度失败: {e}", exc_info=True)
         db.rollback()
@@ -72,6 +255,8 @@ def process_document_task(self, upload_id: int, group_id: str, version: str, ver
     """
     db = SessionLocal()
     task_id = self.request.id
+    loop = None
+    version_write_tasks = []
     
     try:
         # 更新任务状态为运行中
@@ -91,10 +276,7 @@ def process_document_task(self, upload_id: int, group_id: str, version: str, ver
         update_task_progress(db, task_id, 5, "准备阶段：验证文档和读取配置", 0, 10)
         
         # 将相对路径转换为绝对路径
-        if not os.path.isabs(document.file_path):
-            file_path_abs = os.path.join("/app", document.file_path)
-        else:
-            file_path_abs = document.file_path
+        file_path_abs = resolve_app_path(document.file_path)
         
         if not os.path.exists(file_path_abs):
             raise Exception(f"文件不存在: {file_path_abs}")
@@ -123,25 +305,29 @@ def process_document_task(self, upload_id: int, group_id: str, version: str, ver
         # 读取Markdown文件（如果存在）
         parsed_content = None
         summary_content = None
+        overview_content = None
         
         if document.parsed_content_path:
-            parsed_content_file_abs = os.path.join("/app", document.parsed_content_path)
+            parsed_content_file_abs = resolve_app_path(document.parsed_content_path)
             if os.path.exists(parsed_content_file_abs):
                 with open(parsed_content_file_abs, 'r', encoding='utf-8') as f:
                     parsed_content = f.read()
                 logger.info(f"已读取parsed_content.md文件: {document.parsed_content_path}")
         
         if document.summary_content_path:
-            summary_content_file_abs = os.path.join("/app", document.summary_content_path)
+            summary_content_file_abs = resolve_app_path(document.summary_content_path)
             if os.path.exists(summary_content_file_abs):
-                with open(summary_content_file_abs, 'r', encoding='utf-8') as f:
-                    summary_content = f.read()
+                # 只需要文档概览章节：优先mmap定位并解码该章节，找不到概览标题时才完整读取
+                overview_content = read_summary_overview(summary_content_file_abs)
+                if overview_content is None:
+                    with open(summary_content_file_abs, 'r', encoding='utf-8') as f:
+                        summary_content = f.read()
                 logger.info(f"已读取summary_content.md文件: {document.summary_content_path}")
         
         # 读取chunks.json（如果步骤4已完成）
         chunks_data = None
         if document.chunks_path:
-            chunks_file_abs = os.path.join("/app", document.chunks_path)
+            chunks_file_abs = resolve_app_path(document.chunks_path)
             if os.path.exists(chunks_file_abs):
                 with open(chunks_file_abs, 'r', encoding='utf-8') as f:
                     chunks_data = json.load(f)
@@ -150,12 +336,13 @@ def process_document_task(self, upload_id: int, group_id: str, version: str, ver
         # 如果文件不存在，需要重新解析文档
         document_id_for_content = f"upload_{upload_id}"
         doc_data = None
-        if parsed_content is None or summary_content is None:
+        summary_missing = summary_content is None and overview_content is None
+        if parsed_content is None or summary_missing:
             # 更新进度：解析阶段（15%）
             self.update_progress(15, "解析阶段：解析Word文档")
             update_task_progress(db, task_id, 15, "解析阶段：解析Word文档", 1, 10)
             
-            doc_data = WordDocumentService._parse_word_document(file_path_abs, document_id_for_content)
+            doc_data = load_doc_data(file_path_abs, document_id_for_content)
             logger.info(f"文档解析完成: {len(doc_data['structured_content'])} 个元素")
             
             # 重新构建parsed_content和summary_content
@@ -194,14 +381,16 @@ def process_document_task(self, upload_id: int, group_id: str, version: str, ver
                     )
                     logger.info(f"文档分为 {len(sections)} 个章节（重新分块）")
                     
+                    section_index = WordDocumentService._build_section_index(doc_data["structured_content"])
                     for idx, section in enumerate(sections):
                         section_content = WordDocumentService._build_section_content(
-                            section, doc_data, idx, document_id_for_content, upload_id
+                            section, doc_data, idx, document_id_for_content, upload_id,
+                            section_index=section_index
                         )
                         if section_content:
                             parsed_content += section_content + "\n\n"
             
-            if summary_content is None:
+            if summary_missing:
                 if chunks_data is None:
                     sections = WordDocumentService._split_by_sections(
                         doc_data["structured_content"],
@@ -221,7 +410,7 @@ def process_document_task(self, upload_id: int, group_id: str, version: str, ver
         
         # 如果doc_data不存在，需要解析来获取structured_content（用于图片/表格Episode）
         if doc_data is None:
-            doc_data = WordDocumentService._parse_word_document(file_path_abs, document_id_for_content)
+            doc_data = load_doc_data(file_path_abs, document_id_for_content)
             logger.info(f"文档解析完成: {len(doc_data['structured_content'])} 个元素（用于创建图片/表格Episode）")
         
         # 准备章节数据（用于创建章节级Episode）
@@ -240,33 +429,14 @@ def process_document_task(self, upload_id: int, group_id: str, version: str, ver
         elif parsed_content:
             # 从parsed_content按章节标题分割
             logger.info("从parsed_content分割章节（chunks.json不存在）")
-            lines = parsed_content.split('\n')
-            current_section = None
-            current_content = []
-            
-            for line in lines:
-                if line.strip().startswith('# ') and not line.strip().startswith('##'):
-                    if current_section:
-                        section_episodes_data.append({
-                            "chunk_id": f"chunk_{len(section_episodes_data) + 1}",
-                            "title": current_section,
-                            "level": 1,
-                            "content": '\n'.join(current_content).strip(),
-                            "start_index": 0,
-                            "end_index": 0
-                        })
-                    current_section = line.strip()[2:].strip()
-                    current_content = [line]
-                else:
-                    if current_section:
-                        current_content.append(line)
-            
-            if current_section:
+            h1_matches = list(_H1_HEADING_RE.finditer(parsed_content))
+            for match_idx, match in enumerate(h1_matches):
+                section_end = h1_matches[match_idx + 1].start() if match_idx + 1 < len(h1_matches) else len(parsed_content)
                 section_episodes_data.append({
                     "chunk_id": f"chunk_{len(section_episodes_data) + 1}",
-                    "title": current_section,
+                    "title": match.group(1).strip(),
                     "level": 1,
-                    "content": '\n'.join(current_content).strip(),
+                    "content": parsed_content[match.start():section_end].strip(),
                     "start_index": 0,
                     "end_index": 0
                 })
@@ -289,30 +459,16 @@ def process_document_task(self, upload_id: int, group_id: str, version: str, ver
         self.update_progress(10, "创建文档级Episode")
         update_task_progress(db, task_id, 10, "创建文档级Episode", 1, total_steps)
         
-        summary_lines = summary_content.split('\n')
-        overview_start = None
-        overview_end = None
-        for idx, line in enumerate(summary_lines):
-            if line.strip() == "## 文档概览":
-                overview_start = idx + 1
-            elif overview_start is not None and line.startswith("## ") and line.strip() != "## 文档概览":
-                overview_end = idx
-                break
-        
-        if overview_start is not None:
-            overview_content = '\n'.join(summary_lines[overview_start:overview_end if overview_end else len(summary_lines)])
-        else:
-            overview_content = summary_content[:1000]
+        if overview_content is None:
+            overview_span = find_overview_span(summary_content, OVERVIEW_HEADING, "\n", "\n## ")
+            if overview_span is not None:
+                overview_content = summary_content[overview_span[0]:overview_span[1]]
+            else:
+                overview_content = summary_content[:1000]
         
         # 估算token数量并限制overview_content长度
         # 本地大模型最大上下文: 35,488 tokens
         # 需要预留空间给prompt和completion，实际可用约25,000 tokens
-        def estimate_tokens(text: str) -> int:
-            """估算文本的token数（中文通常1 token ≈ 2字符，英文1 token ≈ 4字符）"""
-            chinese_chars = len([c for c in text if '\u4e00' <= c <= '\u9fff'])
-            other_chars = len(text) - chinese_chars
-            return (chinese_chars // 2) + (other_chars // 4)
-        
         max_episode_tokens = 25000  # 预留空间给prompt和completion
         estimated_tokens = estimate_tokens(overview_content)
         
@@ -348,57 +504,85 @@ def process_document_task(self, upload_id: int, group_id: str, version: str, ver
         document_episode_uuid = document_episode.episode.uuid
         logger.info(f"文档级 Episode 创建完成: {document_episode_uuid}")
         
-        # 更新文档级Episode的版本信息
-        update_version_query = """
-        MATCH (e:Episodic)
-        WHERE e.uuid = $episode_uuid
-        SET e.version = $version,
-            e.version_number = $version_number,
-            e.document_name = $document_name,
-            e.file_path = $file_path,
-            e.original_filename = $original_filename
-        RETURN e.uuid as uuid
-        """
-        neo4j_client.execute_write(update_version_query, {
-            "episode_uuid": document_episode_uuid,
-            "version": version,
-            "version_number": version_number,
-            "document_name": document.file_name,
-            "file_path": file_path_abs,
-            "original_filename": os.path.basename(file_path_abs)
-        })
+        # Episode版本信息先收集，再用UNWIND批量写入（避免每个Episode一次往返）
+        # 写入通过Graphiti的异步Neo4j驱动在同一事件循环中后台执行，不阻塞后续Episode的创建
+        version_update_uuids = []
+        
+        def flush_version_updates():
+            if not version_update_uuids:
+                return
+            version_write_tasks.append(loop.create_task(graphiti.driver.execute_query(
+                UPDATE_EPISODE_VERSION_QUERY,
+                params={
+                    "episode_uuids": list(version_update_uuids),
+                    "version": version,
+                    "version_number": version_number,
+                    "document_name": document.file_name,
+                    "file_path": file_path_abs,
+                    "original_filename": os.path.basename(file_path_abs)
+                }
+            )))
+            version_update_uuids.clear()
+        
+        def queue_version_update(episode_uuid: str):
+            version_update_uuids.append(episode_uuid)
+            if len(version_update_uuids) >= VERSION_UPDATE_BATCH_SIZE:
+                flush_version_updates()
+        
+        queue_version_update(document_episode_uuid)
+        
+        # 并发创建Episode：信号量限制同时进行的 add_episode 数量，gather 保持结果顺序
+        reference_time = doc_data["metadata"].get("created") or datetime.now()
+        episode_semaphore = asyncio.Semaphore(settings.EPISODE_MAX_CONCURRENT)
+        completed_episodes = 1  # 文档级Episode已完成
+        
+        async def add_episodes_concurrently(episodes_kwargs, step_name, progress_start, progress_span, step_titles=None):
+            total = len(episodes_kwargs)
+            done = 0
+            
+            async def add_one(idx, kwargs):
+                nonlocal done, completed_episodes
+                async with episode_semaphore:
+                    episode = await graphiti.add_episode(**kwargs)
+                done += 1
+                completed_episodes += 1
+                progress = progress_start + int(done / max(total, 1) * progress_span)
+                current_step = f"{step_name} ({done}/{total})"
+                if step_titles:
+                    current_step += f": {step_titles[idx][:30]}"
+                self.update_progress(progress, current_step)
+                # 阶段内逐个Episode的进度节流写库，阶段最后一个Episode始终写入
+                update_task_progress(db, task_id, progress, current_step, completed_episodes, total_steps, throttle=done < total)
+                return episode
+            
+            return await asyncio.gather(*(add_one(idx, kwargs) for idx, kwargs in enumerate(episodes_kwargs)))
         
         # 创建章节级Episode（50%）
         section_episodes = []
         section_episode_map = {}
         
-        for idx, section_data in enumerate(section_episodes_data):
-            progress = 10 + int((idx + 1) / total_sections * 50)  # 10% - 60%
-            current_step = f"创建章节级Episode ({idx+1}/{total_sections}): {section_data['title'][:30]}"
-            self.update_progress(progress, current_step)
-            update_task_progress(db, task_id, progress, current_step, 1 + idx + 1, total_steps)
-            
-            section_episode = loop.run_until_complete(graphiti.add_episode(
-                name=f"{document.file_name}_章节_{idx+1}_{section_data['title'][:20]}",
-                episode_body=section_data["content"],
-                source_description="Word文档章节",
-                reference_time=doc_data["metadata"].get("created") or datetime.now(),
-                entity_types=entity_types_dict,
-                edge_types=edge_types_dict,
-                edge_type_map=edge_type_map_dict,
-                group_id=group_id,
-                previous_episode_uuids=[document_episode_uuid]
-            ))
-            
-            neo4j_client.execute_write(update_version_query, {
-                "episode_uuid": section_episode.episode.uuid,
-                "version": version,
-                "version_number": version_number,
-                "document_name": document.file_name,
-                "file_path": file_path_abs,
-                "original_filename": os.path.basename(file_path_abs)
-            })
+        section_results = loop.run_until_complete(add_episodes_concurrently(
+            [
+                dict(
+                    name=f"{document.file_name}_章节_{idx+1}_{section_data['title'][:20]}",
+                    episode_body=section_data["content"],
+                    source_description="Word文档章节",
+                    reference_time=reference_time,
+                    entity_types=entity_types_dict,
+                    edge_types=edge_types_dict,
+                    edge_type_map=edge_type_map_dict,
+                    group_id=group_id,
+                    previous_episode_uuids=[document_episode_uuid]
+                )
+                for idx, section_data in enumerate(section_episodes_data)
+            ],
+            "创建章节级Episode", 10, 50,  # 10% - 60%
+            step_titles=[section_data['title'] for section_data in section_episodes_data]
+        ))
+        
+        for idx, (section_data, section_episode) in enumerate(zip(section_episodes_data, section_results)):
             section_episode_uuid = section_episode.episode.uuid
+            queue_version_update(section_episode_uuid)
             section_episodes.append(section_episode_uuid)
             
             chunk_id = section_data.get('chunk_id', f"chunk_{idx+1}")
@@ -406,46 +590,42 @@ def process_document_task(self, upload_id: int, group_id: str, version: str, ver
             
             logger.info(f"章节级 Episode {idx+1} 创建完成: {section_episode_uuid} (chunk_id: {chunk_id})")
         
+        flush_version_updates()
+        
         # 辅助函数：根据图片/表格在structured_content中的位置，找到对应的chunk_id
-        def find_chunk_for_item(item_position, structured_content, chunks_data):
-            if not chunks_data or not chunks_data.get('chunks'):
+        # chunks按structured_content顺序切分，预先构建起止位置数组，用二分查找定位
+        chunk_list = chunks_data.get('chunks') if chunks_data else None
+        chunk_starts = [chunk.get('start_index', 0) for chunk in chunk_list or []]
+        chunk_ends = [chunk.get('end_index', len(doc_data.get("structured_content", []))) for chunk in chunk_list or []]
+        chunk_ids = [chunk.get('chunk_id') for chunk in chunk_list or []]
+        
+        def find_chunk_for_item(item_position):
+            if not chunk_ids:
                 return None
-            for chunk in chunks_data['chunks']:
-                start_idx = chunk.get('start_index', 0)
-                end_idx = chunk.get('end_index', len(structured_content))
-                if start_idx <= item_position < end_idx:
-                    return chunk.get('chunk_id')
-            if chunks_data['chunks']:
-                return chunks_data['chunks'][0].get('chunk_id')
-            return None
+            pos = bisect.bisect_right(chunk_starts, item_position) - 1
+            if pos >= 0 and item_position < chunk_ends[pos]:
+                return chunk_ids[pos]
+            return chunk_ids[0]
         
-        # 构建图片位置到structured_content索引的映射
+        # 构建图片/表格ID到structured_content索引的映射（单次遍历）
         image_position_to_structured_idx = {}
+        table_position_to_structured_idx = {}
         structured_content = doc_data.get("structured_content", [])
         for idx, item in enumerate(structured_content):
-            if item.get("type") in ["paragraph", "heading"]:
-                images_in_item = item.get("images", [])
-                for img in images_in_item:
+            item_type = item.get("type")
+            if item_type in ("paragraph", "heading"):
+                for img in item.get("images") or ():
                     image_id = img.get("image_id")
                     if image_id:
                         image_position_to_structured_idx[image_id] = idx
-        
-        # 构建表格位置到structured_content索引的映射
-        table_position_to_structured_idx = {}
-        for idx, item in enumerate(structured_content):
-            if item.get("type") == "table":
+            elif item_type == "table":
                 table_id = item.get("table_id")
                 if table_id:
                     table_position_to_structured_idx[table_id] = idx
         
-        # 创建图片Episode（10%）
-        image_episodes = []
+        # 准备图片Episode（章节Episode已全部创建，section_episode_map 完整）
+        image_episodes_kwargs = []
         for idx, image in enumerate(doc_data.get("images", [])):
-            progress = 60 + int((idx + 1) / max(total_images, 1) * 10)  # 60% - 70%
-            current_step = f"创建图片Episode ({idx+1}/{total_images})"
-            self.update_progress(progress, current_step)
-            update_task_progress(db, task_id, progress, current_step, 1 + total_sections + idx + 1, total_steps)
-            
             image_desc = image.get("description", "图片")
             image_id = image.get("image_id", f"image_{idx+1}")
             image_url = f"/api/document-upload/{upload_id}/images/{image_id}"
@@ -457,35 +637,29 @@ def process_document_task(self, upload_id: int, group_id: str, version: str, ver
             
             if file_size == 0 or file_format == "未知":
                 if file_path:
-                    abs_file_path = file_path if os.path.isabs(file_path) else os.path.join("/app", file_path)
+                    abs_file_path = resolve_app_path(file_path)
                     if os.path.exists(abs_file_path):
                         file_size = os.path.getsize(abs_file_path)
                         if file_format == "未知":
                             ext = os.path.splitext(abs_file_path)[1]
                             file_format = ext[1:].upper() if ext else "UNKNOWN"
             
-            image_content = f"""## 图片信息
-
-**图片ID**: {image_id}
-**描述**: {image_desc}
-**文件路径**: {file_path}
-**相对路径**: {relative_path}
-**文件大小**: {file_size} 字节
-**文件格式**: {file_format}
-
-### 图片链接
-![{image_desc}]({image_url})
-
-### 图片说明
-这是一张从Word文档中提取的图片。
-"""
+            image_content = IMAGE_EPISODE_TEMPLATE.format(
+                image_id=image_id,
+                image_desc=image_desc,
+                file_path=file_path,
+                relative_path=relative_path,
+                file_size=file_size,
+                file_format=file_format,
+                image_url=image_url
+            )
             
             image_id_key = image.get("image_id", "")
             structured_idx = image_position_to_structured_idx.get(image_id_key)
             section_episode_uuid_for_image = None
             
             if structured_idx is not None and chunks_data:
-                chunk_id = find_chunk_for_item(structured_idx, structured_content, chunks_data)
+                chunk_id = find_chunk_for_item(structured_idx)
                 if chunk_id and chunk_id in section_episode_map:
                     section_episode_uuid_for_image = section_episode_map[chunk_id]
             
@@ -493,58 +667,36 @@ def process_document_task(self, upload_id: int, group_id: str, version: str, ver
             if section_episode_uuid_for_image:
                 previous_episode_uuids.append(section_episode_uuid_for_image)
             
-            image_episode = loop.run_until_complete(graphiti.add_episode(
+            image_episodes_kwargs.append(dict(
                 name=f"{document.file_name}_图片_{idx+1}_{image.get('image_id', '')}",
                 episode_body=image_content,
                 source_description="Word文档图片",
-                reference_time=doc_data["metadata"].get("created") or datetime.now(),
+                reference_time=reference_time,
                 entity_types=entity_types_dict,
                 edge_types=edge_types_dict,
                 edge_type_map=edge_type_map_dict,
                 group_id=group_id,
                 previous_episode_uuids=previous_episode_uuids
             ))
-            
-            neo4j_client.execute_write(update_version_query, {
-                "episode_uuid": image_episode.episode.uuid,
-                "version": version,
-                "version_number": version_number,
-                "document_name": document.file_name,
-                "file_path": file_path_abs,
-                "original_filename": os.path.basename(file_path_abs)
-            })
-            image_episodes.append(image_episode.episode.uuid)
-        
-        # 创建表格Episode（5%）
-        table_episodes = []
+        
+        # 准备表格Episode
+        table_episodes_kwargs = []
         for idx, table_data in enumerate(doc_data.get("tables", [])):
-            progress = 70 + int((idx + 1) / max(total_tables, 1) * 5)  # 70% - 75%
-            current_step = f"创建表格Episode ({idx+1}/{total_tables})"
-            self.update_progress(progress, current_step)
-            update_task_progress(db, task_id, progress, current_step, 1 + total_sections + total_images + idx + 1, total_steps)
-            
             table_markdown = WordDocumentService._format_table_as_markdown(table_data)
             table_id = table_data.get('table_id', f'table_{idx+1}')
-            table_content = f"""## 表格信息
-
-**表格序号**: {idx+1}
-**表格ID**: {table_id}
-**行数**: {len(table_data.get('rows', []))}
-**列数**: {len(table_data.get('headers', []))}
-
-### 表格内容
-
-{table_markdown}
-
-### 表格说明
-这是从Word文档中提取的表格数据，使用标准Markdown表格格式，包含结构化的信息。
-"""
+            table_content = TABLE_EPISODE_TEMPLATE.format(
+                table_index=idx + 1,
+                table_id=table_id,
+                row_count=len(table_data.get('rows', [])),
+                column_count=len(table_data.get('headers', [])),
+                table_markdown=table_markdown
+            )
             
             structured_idx = table_position_to_structured_idx.get(table_id)
             section_episode_uuid_for_table = None
             
             if structured_idx is not None and chunks_data:
-                chunk_id = find_chunk_for_item(structured_idx, structured_content, chunks_data)
+                chunk_id = find_chunk_for_item(structured_idx)
                 if chunk_id and chunk_id in section_episode_map:
                     section_episode_uuid_for_table = section_episode_map[chunk_id]
             
@@ -552,27 +704,33 @@ def process_document_task(self, upload_id: int, group_id: str, version: str, ver
             if section_episode_uuid_for_table:
                 previous_episode_uuids.append(section_episode_uuid_for_table)
             
-            table_episode = loop.run_until_complete(graphiti.add_episode(
+            table_episodes_kwargs.append(dict(
                 name=f"{document.file_name}_表格_{idx+1}_{table_id}",
                 episode_body=table_content,
                 source_description="Word文档表格",
-                reference_time=doc_data["metadata"].get("created") or datetime.now(),
+                reference_time=reference_time,
                 entity_types=entity_types_dict,
                 edge_types=edge_types_dict,
                 edge_type_map=edge_type_map_dict,
                 group_id=group_id,
                 previous_episode_uuids=previous_episode_uuids
             ))
-            
-            neo4j_client.execute_write(update_version_query, {
-                "episode_uuid": table_episode.episode.uuid,
-                "version": version,
-                "version_number": version_number,
-                "document_name": document.file_name,
-                "file_path": file_path_abs,
-                "original_filename": os.path.basename(file_path_abs)
-            })
-            table_episodes.append(table_episode.episode.uuid)
+        
+        # 图片与表格Episode（60% - 75%）合并为一个阶段并发创建，使用同一计数器保证进度单调递增
+        media_results = loop.run_until_complete(add_episodes_concurrently(
+            image_episodes_kwargs + table_episodes_kwargs, "创建图片/表格Episode", 60, 15
+        ))
+        image_results = media_results[:len(image_episodes_kwargs)]
+        table_results = media_results[len(image_episodes_kwargs):]
+        
+        image_episodes = [image_episode.episode.uuid for image_episode in image_results]
+        table_episodes = [table_episode.episode.uuid for table_episode in table_results]
+        for episode_uuid in image_episodes + table_episodes:
+            queue_version_update(episode_uuid)
+        flush_version_updates()
+        
+        # 等待所有版本信息写入完成
+        loop.run_until_complete(asyncio.gather(*version_write_tasks))
         
         # 更新文档状态和document_id
         document.status = DocumentStatus.COMPLETED
@@ -611,7 +769,6 @@ def process_document_task(self, upload_id: int, group_id: str, version: str, ver
         
         logger.info(f"文档处理完成: upload_id={upload_id}, group_id={group_id}")
         
-        loop.close()
         return result
         
     except Exception as e:
@@ -641,5 +798,12 @@ def process_document_task(self, upload_id: int, group_id: str, version: str, ver
         raise
     
     finally:
+        if loop is not None:
+            # Episode阶段异常时，先等待已提交的版本写入结束，避免任务随事件循环关闭而被销毁
+            pending_version_writes = [write_task for write_task in version_write_tasks if not write_task.done()]
+            if pending_version_writes:
+                loop.run_until_complete(asyncio.gather(*pending_version_writes, return_exceptions=True))
+            loop.close()
+        _last_progress_write.pop(task_id, None)
         db.close()
 
@@ -163,9 +163,11 @@ def process_document_enhanced_task(
                 parsed_content_text += prefix_content + "\n\n"
         
         # 按章节输出每个章节的内容
+        section_index = WordDocumentService._build_section_index(structured_content)
         for section in temp_sections:
             section_content = WordDocumentService._build_section_content(
-                section, doc_data, temp_sections.index(section), document_id_for_content, upload_id
+                section, doc_data, temp_sections.index(section), document_id_for_content, upload_id,
+                section_index=section_index
             )
             if section_content:
                 parsed_content_text += section_content + "\n\n"
@@ -130,9 +130,11 @@ def process_knowledge_base_document_task(
                 parsed_content += prefix_content + "\n\n"
         
         # 按章节输出每个章节的内容
+        section_index = WordDocumentService._build_section_index(doc_data["structured_content"])
         for section in sections:
             section_content = WordDocumentService._build_section_content(
-                section, doc_data, sections.index(section), document_id_for_content, upload_id
+                section, doc_data, sections.index(section), document_id_for_content, upload_id,
+                section_index=section_index
             )
             if section_content:
                 parsed_content += section_content + "\n\n"
@@ -0,0 +1,100 @@
+"""
+文档解析缓存（load_doc_data）测试
+
+在后端容器内运行：python -m unittest discover tests
+"""
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+from docx import Document
+
+from app.services.word_document_service import WordDocumentService
+from app.tasks import document_processing
+
+
+class DocDataCacheTest(unittest.TestCase):
+    """缓存命中时返回的解析结果必须与重新解析的结果分块一致"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        document = Document()
+        document.core_properties.created = datetime(2024, 5, 1, 8, 30)
+        document.add_heading("第一章 系统概述", level=1)
+        document.add_paragraph("本章介绍系统的整体架构。" * 20)
+        document.add_heading("1.1 模块划分", level=2)
+        document.add_paragraph("系统由接入层、服务层和存储层组成。")
+        table = document.add_table(rows=2, cols=2)
+        table.cell(0, 0).text = "模块"
+        table.cell(0, 1).text = "说明"
+        table.cell(1, 0).text = "服务层"
+        table.cell(1, 1).text = "处理业务逻辑"
+        document.add_heading("第二章 接口设计", level=1)
+        document.add_paragraph("接口采用REST风格。")
+        self.file_path = os.path.join(self.tmp_dir.name, "sample.docx")
+        document.save(self.file_path)
+
+        # 缓存文件写入临时目录
+        app_root_patch = mock.patch.object(document_processing, "_APP_ROOT", self.tmp_dir.name + "/")
+        app_root_patch.start()
+        self.addCleanup(app_root_patch.stop)
+
+    def test_cache_hit_matches_fresh_parse(self):
+        with mock.patch.object(
+            WordDocumentService,
+            "_parse_word_document",
+            wraps=WordDocumentService._parse_word_document
+        ) as parse:
+            fresh = document_processing.load_doc_data(self.file_path, "upload_cache_test")
+            cached = document_processing.load_doc_data(self.file_path, "upload_cache_test")
+
+        self.assertEqual(parse.call_count, 1)
+        self.assertEqual(cached, fresh)
+        self.assertEqual(cached["metadata"]["created"], fresh["metadata"]["created"])
+        self.assertIsInstance(cached["metadata"]["created"], datetime)
+
+        fresh_sections = WordDocumentService._split_by_sections(fresh["structured_content"], max_tokens=8000)
+        cached_sections = WordDocumentService._split_by_sections(cached["structured_content"], max_tokens=8000)
+        self.assertEqual(cached_sections, fresh_sections)
+        self.assertEqual([section["title"] for section in cached_sections], ["第一章 系统概述", "第二章 接口设计"])
+        self.assertEqual(len(cached_sections[0]["tables"]), 1)
+
+        for strategy in ("level_1", "level_2", "fixed_token", "no_split"):
+            with self.subTest(strategy=strategy):
+                self.assertEqual(
+                    WordDocumentService._split_by_sections_with_strategy(cached["structured_content"], strategy=strategy, max_tokens=8000),
+                    WordDocumentService._split_by_sections_with_strategy(fresh["structured_content"], strategy=strategy, max_tokens=8000)
+                )
+
+    def test_cache_file_is_json(self):
+        document_processing.load_doc_data(self.file_path, "upload_cache_test")
+        cache_path = os.path.join(self.tmp_dir.name, "uploads/parsed_content/upload_cache_test/doc_data.json")
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        self.assertEqual(cached["file_path"], self.file_path)
+        self.assertEqual(
+            datetime.fromisoformat(cached["doc_data"]["metadata"]["created"]),
+            datetime(2024, 5, 1, 8, 30, tzinfo=timezone.utc)
+        )
+
+    def test_modified_file_invalidates_cache(self):
+        with mock.patch.object(
+            WordDocumentService,
+            "_parse_word_document",
+            wraps=WordDocumentService._parse_word_document
+        ) as parse:
+            document_processing.load_doc_data(self.file_path, "upload_cache_test")
+            stat = os.stat(self.file_path)
+            os.utime(self.file_path, (stat.st_atime, stat.st_mtime + 10))
+            document_processing.load_doc_data(self.file_path, "upload_cache_test")
+
+        self.assertEqual(parse.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()